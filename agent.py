@@ -1,24 +1,40 @@
-from google import genai
-from google.genai import types
+import contextlib
+import functools
+import itertools
 import os
-from dotenv import load_dotenv
+import threading
+import time
+from collections import deque
+from batch import run_batch
+from chat_memory import ChatMemory
+from clients import new_client
+from context_cache import SystemPromptCache
+from hedging import Hedger
+from resilience import resilience_from_env
+from response_cache import ResponseCache
+from singleflight import DEFAULT_GROUP
+from summarizer import Summarizer
+from tokens import CONTEXT_WINDOW, DEFAULT_ESTIMATOR, PromptTooLargeError
+from turn_history import Turn
 
-# Load environment variables
-load_dotenv()
+# Methods whose responses may be served from the response cache. Generation
+# runs at temperature=0.7, so every call samples a fresh answer; only the
+# reference-style methods opt in by default. Reviews, solutions and chat
+# replies are always sent upstream.
+CACHEABLE_METHODS = ("answer_question", "generate_hard_questions")
 
-class DataScienceExpertAgent:
-    def __init__(self):
-        """Initialize the Data Science Expert AI Agent"""
-        # Configure Gemini API
-        api_key = os.getenv('GEMINI_API_KEY')
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY not found in .env file")
-        
-        # Initialize client
-        self.client = genai.Client(api_key=api_key)
-        
-        # Expert system prompt
-        self.system_prompt = """You are a world-class Data Science Expert with 100 years of combined experience in:
+# Methods whose answers may be reused for near-duplicate questions
+SEMANTIC_METHODS = ("answer_question", "chat_with_agent")
+
+# Methods scheduled ahead of the rest when a scheduler is set; batch methods
+# run as bulk work
+INTERACTIVE_METHODS = ("chat_with_agent",)
+
+# Model every agent generates with
+MODEL = 'gemini-2.5-flash'
+
+# Expert system prompt, shared by every agent
+SYSTEM_PROMPT = """You are a world-class Data Science Expert with 100 years of combined experience in:
 - Data Science & Analytics
 - Machine Learning & Deep Learning
 - Data Engineering & Big Data
@@ -49,29 +65,14 @@ You can handle topics like:
 
 Respond with expertise, precision, and practical examples."""
 
-        # Chat history
-        self.chat_history = []
-        
-    def _send_message(self, prompt):
-        """Send message to Gemini"""
-        full_prompt = self.system_prompt + "\n\n" + prompt
-        
-        response = self.client.models.generate_content(
-            model='gemini-2.5-flash',
-            contents=full_prompt,
-            config=types.GenerateContentConfig(
-                temperature=0.7,
-                top_p=0.95,
-                top_k=40,
-                max_output_tokens=8192,
-            )
-        )
-        
-        return response.text
-    
-    def generate_hard_questions(self, topic, difficulty="expert", num_questions=5):
-        """Generate challenging data science questions"""
-        prompt = f"""As a 100-year experienced Data Science expert, generate {num_questions} {difficulty}-level questions on {topic}.
+# What to do with input over the token budget: fail fast, cut it down, or
+# (for code reviews) review it in parts
+OVERSIZE_POLICIES = ("reject", "truncate", "chunk")
+
+
+def build_questions_prompt(topic, difficulty="expert", num_questions=5):
+    """Build the prompt for generating challenging questions"""
+    return f"""As a 100-year experienced Data Science expert, generate {num_questions} {difficulty}-level questions on {topic}.
 
 Make these questions:
 - Highly challenging and thought-provoking
@@ -81,11 +82,10 @@ Make these questions:
 
 Format each question clearly with numbering."""
 
-        return self._send_message(prompt)
-    
-    def answer_question(self, question):
-        """Answer data science questions with expert knowledge"""
-        prompt = f"""As a 100-year experienced Data Science expert, provide a comprehensive answer to:
+
+def build_answer_prompt(question):
+    """Build the prompt for answering a data science question"""
+    return f"""As a 100-year experienced Data Science expert, provide a comprehensive answer to:
 
 {question}
 
@@ -97,11 +97,10 @@ Include:
 - Common pitfalls to avoid
 - Real-world applications"""
 
-        return self._send_message(prompt)
-    
-    def review_code(self, code, context=""):
-        """Review and optimize data science code"""
-        prompt = f"""As a 100-year experienced Data Science expert, review this code:
+
+def build_review_prompt(code, context=""):
+    """Build the prompt for reviewing code"""
+    return f"""As a 100-year experienced Data Science expert, review this code:
 
 Context: {context}
 
@@ -117,11 +116,10 @@ Provide:
 - Potential bugs or issues
 - Improved version of the code"""
 
-        return self._send_message(prompt)
-    
-    def solve_problem(self, problem_description):
-        """Solve complex data science problems"""
-        prompt = f"""As a 100-year experienced Data Science expert, solve this problem:
+
+def build_problem_prompt(problem_description):
+    """Build the prompt for solving a data science problem"""
+    return f"""As a 100-year experienced Data Science expert, solve this problem:
 
 {problem_description}
 
@@ -132,20 +130,731 @@ Provide:
 - Code examples
 - Trade-offs and recommendations"""
 
-        return self._send_message(prompt)
+
+class DataScienceExpertAgent:
+    def __init__(self, cache=None, cacheable_methods=CACHEABLE_METHODS,
+                 context_cache_ttl=None, context_cache=None, resilience=None,
+                 singleflight=None, semantic_cache=None, client=None, hedger=None, chat_token_budget=16000,
+                 summarize=True, max_input_tokens=None, oversize_policy=None,
+                 token_estimator=None, recall_k=None, recorder=None, scheduler=None,
+                 session_id=None):
+        """Initialize the Data Science Expert AI Agent"""
+        # Configure Gemini API (a shared client may be passed in instead)
+        if client is None:
+            api_key = os.getenv('GEMINI_API_KEY')
+            if not api_key:
+                raise ValueError("GEMINI_API_KEY not found in .env file")
+            # google.genai is imported on the first request, not here
+            client = new_client(api_key)
+        
+        # Initialize client
+        self.client = client
+        
+        # Expert system prompt
+        self.system_prompt = SYSTEM_PROMPT
+
+        # Generation settings
+        self.model = MODEL
+        self.generation_config = {
+            'temperature': 0.7,
+            'top_p': 0.95,
+            'top_k': 40,
+            'max_output_tokens': 8192,
+        }
+
+        # Response cache (enabled by passing a cache or setting RESPONSE_CACHE_PATH)
+        if cache is None and os.getenv('RESPONSE_CACHE_PATH'):
+            cache = ResponseCache(os.getenv('RESPONSE_CACHE_PATH'))
+        self.cache = cache
+        self.cacheable_methods = set(cacheable_methods)
+
+        # Explicit context cache for the system prompt (enabled by passing one or a
+        # TTL in seconds, or setting GEMINI_CONTEXT_CACHE_TTL); without it the prompt
+        # is sent as a system_instruction and only implicit caching applies
+        if context_cache_ttl is None and os.getenv('GEMINI_CONTEXT_CACHE_TTL'):
+            context_cache_ttl = int(os.getenv('GEMINI_CONTEXT_CACHE_TTL'))
+        if context_cache is None and context_cache_ttl:
+            context_cache = SystemPromptCache(
+                self.client, self.model, self.system_prompt, ttl=context_cache_ttl
+            )
+        self.context_cache = context_cache
+
+        # Retries, rate limiting and circuit breaking (quota from GEMINI_RPM / GEMINI_TPM);
+        # pass one shared instance when several agents run in a process
+        self.resilience = resilience if resilience is not None else resilience_from_env()
+
+        # Near-duplicate question cache (enabled by passing one or setting
+        # SEMANTIC_CACHE_PATH; SEMANTIC_CACHE_EMBEDDER=gemini embeds via the API)
+        if semantic_cache is None and os.getenv('SEMANTIC_CACHE_PATH'):
+            from semantic_cache import semantic_cache_from_env
+            semantic_cache = semantic_cache_from_env(self.client)
+        self.semantic_cache = semantic_cache
+
+        # Request coalescing, shared process-wide unless a group is passed in
+        self.singleflight = singleflight if singleflight is not None else DEFAULT_GROUP
+
+        # Hedged requests against slow upstream replicas (opt in with GEMINI_HEDGING=1);
+        # pass one shared hedger when several agents run in a process so they learn together
+        if hedger is None and os.getenv('GEMINI_HEDGING') == '1':
+            hedger = Hedger()
+        self.hedger = hedger
+
+        # Token usage reported in usage_metadata
+        self._usage_lock = threading.Lock()
+        self.last_usage = None
+        self.usage_totals = {
+            'requests': 0,
+            'prompt_tokens': 0,
+            'cached_tokens': 0,
+            'output_tokens': 0,
+        }
+
+        # Local token estimates, checked before any request is sent. The budget
+        # defaults to what fits in the context window next to the default output
+        # (GEMINI_MAX_INPUT_TOKENS / GEMINI_OVERSIZE_POLICY override)
+        self.token_estimator = token_estimator if token_estimator is not None else DEFAULT_ESTIMATOR
+        if max_input_tokens is None:
+            max_input_tokens = int(os.getenv(
+                'GEMINI_MAX_INPUT_TOKENS',
+                CONTEXT_WINDOW - self.generation_config['max_output_tokens']
+            ))
+        self.max_input_tokens = max_input_tokens
+        oversize_policy = oversize_policy or os.getenv('GEMINI_OVERSIZE_POLICY', 'reject')
+        if oversize_policy not in OVERSIZE_POLICIES:
+            raise ValueError(f"oversize_policy must be one of {', '.join(OVERSIZE_POLICIES)}")
+        self.oversize_policy = oversize_policy
+
+        # Called with a record of every completed call (prompt, response, timings,
+        # token usage), e.g. ConversationStore.record_artifact for JSONL export
+        self.recorder = recorder
+
+        # Admission control and fair queuing shared with other sessions' agents (a
+        # scheduler.FairScheduler); calls queue under `session_id`, or this agent
+        self.scheduler = scheduler
+        self.session_id = session_id
+        self._local = threading.local()
+
+        # Time-to-first-token of recent streamed requests (seconds)
+        self.last_ttft = None
+        self.ttft_samples = deque(maxlen=200)
+
+        # Conversational memory: a chat session over a token-budgeted window of turns
+        self.memory = ChatMemory(token_budget=chat_token_budget)
+        self._chat = None
+        self._chat_version = None
+
+        # Recall of relevant turns that have left the window (CHAT_RECALL_K, 0 disables;
+        # CHAT_RECALL_EMBEDDER=gemini embeds via the API)
+        if recall_k is None:
+            recall_k = int(os.getenv('CHAT_RECALL_K', '4'))
+        self.recall = None
+        self.last_turn = None
+        if recall_k:
+            from recall import TurnIndex
+            from semantic_cache import GeminiEmbedder
+            embedder = None
+            if os.getenv('CHAT_RECALL_EMBEDDER') == 'gemini':
+                embedder = GeminiEmbedder(self.client)
+            self.recall = TurnIndex(embedder, k=recall_k)
+
+        # Background summarization of old turns, on a cheaper model by default
+        self.summarizer = None
+        if summarize:
+            self.summarizer = Summarizer(
+                self.client,
+                model=os.getenv('CHAT_SUMMARY_MODEL', 'gemini-2.5-flash-lite'),
+                resilience=self.resilience,
+            )
+        
+    def _cache_lookup(self, prompt, method):
+        """Return (key, cached response) for cacheable methods, else (None, None)"""
+        if self.cache is None or method not in self.cacheable_methods:
+            return None, None
+        key = self._request_key(prompt)
+        return key, self.cache.get(key)
+
+    def _request_key(self, prompt):
+        """Key identifying a request by model, full prompt and generation config"""
+        full_prompt = self.system_prompt + "\n\n" + prompt
+        return ResponseCache.make_key(self.model, full_prompt, self.generation_config)
+
+    def _config(self, contents=None):
+        """Build the generation config, carrying the system prompt out of band"""
+        from google.genai import types
+
+        if self.context_cache is not None:
+            system = self.context_cache.config_kwargs()
+        else:
+            system = {'system_instruction': self.system_prompt}
+        generation = dict(self.generation_config)
+        if contents is not None:
+            generation['max_output_tokens'] = self._output_budget(self._estimate_tokens(contents))
+        return types.GenerateContentConfig(**generation, **system)
+
+    def _output_budget(self, input_tokens):
+        """Size max_output_tokens for a request: the configured cap, lowered to fit the context window"""
+        return max(1, min(self.generation_config['max_output_tokens'], CONTEXT_WINDOW - input_tokens))
+
+    def _fit_input(self, text, template="", reserved=0, split=False):
+        """Apply the oversize policy to user input before anything is sent
+
+        `template` is the prompt the input is placed in and `reserved` any other
+        tokens sent alongside it (chat history); both count against the budget.
+        Returns the list of inputs to send: one unless the policy is "chunk"
+        and the caller can `split` the input across requests (otherwise
+        "chunk" truncates).
+        """
+        budget = self.max_input_tokens - self._estimate_tokens(template) - reserved
+        tokens = self.token_estimator.estimate(text)
+        if tokens <= budget:
+            return [text]
+        if budget <= 0 or self.oversize_policy == "reject":
+            raise PromptTooLargeError(tokens, max(budget, 0))
+        if self.oversize_policy == "chunk" and split:
+            return self.token_estimator.chunk(text, budget)
+        return [self.token_estimator.truncate(text, budget)]
+
+    def _review_prompts(self, code, context=""):
+        """Review prompts for `code`, split into parts when it is over budget"""
+        template = build_review_prompt("", context)
+        return [build_review_prompt(part, context) for part in self._fit_input(code, template, split=True)]
+
+    def calibrate_tokens(self, samples=None):
+        """Calibrate the token estimator with count_tokens; returns the tokens-per-unit ratio"""
+        if samples is None:
+            samples = [self.system_prompt, build_review_prompt("def f(x):\n    return x * 2\n")]
+        return self.token_estimator.calibrate(self.client, self.model, samples)
+
+    def _record_usage(self, usage_metadata, prompt=None):
+        """Accumulate token usage reported by Gemini"""
+        self.last_usage = usage_metadata
+        if usage_metadata is None:
+            return
+        if prompt is not None and usage_metadata.prompt_token_count:
+            # Billed counts keep the local estimator calibrated
+            self.token_estimator.observe(usage_metadata.prompt_token_count, self.system_prompt, prompt)
+        with self._usage_lock:
+            self.usage_totals['requests'] += 1
+            self.usage_totals['prompt_tokens'] += usage_metadata.prompt_token_count or 0
+            self.usage_totals['cached_tokens'] += usage_metadata.cached_content_token_count or 0
+            self.usage_totals['output_tokens'] += usage_metadata.candidates_token_count or 0
+
+    def usage_report(self):
+        """Return cumulative token usage and the share of prompt tokens served from cache"""
+        with self._usage_lock:
+            report = dict(self.usage_totals)
+        prompt_tokens = report['prompt_tokens']
+        report['cached_ratio'] = report['cached_tokens'] / prompt_tokens if prompt_tokens else 0.0
+        if self.context_cache is not None:
+            report['context_cache'] = self.context_cache.stats()
+        return report
+
+    def _estimate_tokens(self, contents):
+        """Estimated input tokens for a request, used for budgets and TPM limiting"""
+        return self.token_estimator.estimate(self.system_prompt, str(contents))
+
+    def _generate(self, contents):
+        """Call generate_content with retries, rate limiting and circuit breaking"""
+        return self.resilience.call(
+            lambda: self._generate_once(contents), tokens=self._estimate_tokens(contents)
+        )
+
+    def _generate_once(self, contents):
+        """Call generate_content, falling back to a plain system instruction if the context cache expired"""
+        from google.genai import errors
+
+        try:
+            return self.client.models.generate_content(
+                model=self.model, contents=contents, config=self._config(contents)
+            )
+        except errors.APIError as e:
+            if self.context_cache is None or not SystemPromptCache.is_cache_error(e):
+                raise
+            self.context_cache.invalidate()
+            return self.client.models.generate_content(
+                model=self.model, contents=contents, config=self._config(contents)
+            )
+
+    def _open_stream(self, contents):
+        """Start generate_content_stream and return (first chunk, stream)"""
+        from google.genai import errors
+
+        try:
+            stream = self.client.models.generate_content_stream(
+                model=self.model, contents=contents, config=self._config(contents)
+            )
+            first = next(stream, None)
+        except errors.APIError as e:
+            if self.context_cache is None or not SystemPromptCache.is_cache_error(e):
+                raise
+            self.context_cache.invalidate()
+            stream = self.client.models.generate_content_stream(
+                model=self.model, contents=contents, config=self._config(contents)
+            )
+            first = next(stream, None)
+        return first, stream
+
+    def _generate_stream(self, contents):
+        """Stream generate_content chunks; only the request up to the first chunk is retried"""
+        first, stream = self.resilience.call(
+            lambda: self._open_stream(contents), tokens=self._estimate_tokens(contents)
+        )
+        try:
+            if first is not None:
+                yield first
+                yield from stream
+        finally:
+            # Closing the SDK generator releases its HTTP response, also when cancelled early
+            stream.close()
+
+    def _slot_args(self, tokens, method):
+        """(session key, cost, priority) of one call for the scheduler"""
+        if getattr(self._local, 'bulk', False):
+            priority = "bulk"
+        elif method in INTERACTIVE_METHODS:
+            priority = "interactive"
+        else:
+            priority = "standard"
+        key = self.session_id if self.session_id is not None else id(self)
+        return key, tokens, priority
+
+    def _slot(self, tokens, method=None):
+        """Hold a scheduler slot for one upstream call; a no-op without a scheduler"""
+        if self.scheduler is None:
+            return contextlib.nullcontext()
+        return self.scheduler.slot(*self._slot_args(tokens, method))
+
+    def _aslot(self, tokens, method=None):
+        """Async variant of _slot()"""
+        if self.scheduler is None:
+            return contextlib.nullcontext()
+        return self.scheduler.aslot(*self._slot_args(tokens, method))
+
+    def _as_bulk(self, fn):
+        """Wrap fn so the calls it makes are scheduled as bulk work"""
+        @functools.wraps(fn)
+        def run(*args):
+            self._local.bulk = True
+            try:
+                return fn(*args)
+            finally:
+                self._local.bulk = False
+        return run
+
+    def _semantic_lookup(self, method, semantic_text):
+        """Return a stored answer to a near-duplicate question, or None"""
+        if self.semantic_cache is None or not semantic_text or method not in SEMANTIC_METHODS:
+            return None
+        return self.semantic_cache.get(method, semantic_text)
+
+    def _remember(self, key, method, semantic_text, text):
+        """Store a fresh response in the exact-match and semantic caches"""
+        if not text:
+            return
+        if key is not None:
+            self.cache.set(key, text)
+        if self.semantic_cache is not None and semantic_text and method in SEMANTIC_METHODS:
+            self.semantic_cache.put(method, semantic_text, text)
+
+    def _emit(self, method, prompt, response, started, source, usage=None, ttft=None):
+        """Pass a record of a completed call to the recorder, if one is set"""
+        if self.recorder is None:
+            return
+        self.recorder({
+            'method': method,
+            'model': self.model,
+            'prompt': prompt,
+            'response': response,
+            'source': source,
+            'created': started,
+            'latency': time.time() - started,
+            'ttft': ttft,
+            'prompt_tokens': getattr(usage, 'prompt_token_count', None),
+            'cached_tokens': getattr(usage, 'cached_content_token_count', None),
+            'output_tokens': getattr(usage, 'candidates_token_count', None),
+        })
+
+    def _send_message(self, prompt, method=None, semantic_text=None):
+        """Send message to Gemini"""
+        started = time.time()
+
+        # Serve repeat prompts from the cache when the method has opted in
+        key, cached = self._cache_lookup(prompt, method)
+        if cached is not None:
+            self._emit(method, prompt, cached, started, 'cache')
+            return cached
+
+        # Then near-duplicates of earlier questions
+        similar = self._semantic_lookup(method, semantic_text)
+        if similar is not None:
+            self._emit(method, prompt, similar, started, 'semantic')
+            return similar
+
+        # Set by fetch() only if this call was the one that went upstream
+        upstream = {}
+
+        def fetch():
+            with self._slot(self._estimate_tokens(prompt), method):
+                if self.hedger is not None:
+                    # Hedging races streamed attempts, keeping whichever finishes first
+                    text, usage = self._collect(self._upstream_chunks(prompt, until_done=True))
+                else:
+                    response = self._generate(prompt)
+                    text, usage = response.text, response.usage_metadata
+            self._record_usage(usage, prompt)
+            self._remember(key, method, semantic_text, text)
+            upstream['usage'] = usage
+            return text
+
+        # Identical prompts already in flight share one upstream call
+        text = self.singleflight.do(self._request_key(prompt), fetch)
+        self._emit(
+            method, prompt, text, started,
+            'upstream' if upstream else 'coalesced', upstream.get('usage')
+        )
+        return text
+
+    def _upstream_chunks(self, prompt, until_done=False):
+        """Stream response chunks, hedged against slow replicas when enabled"""
+        if self.hedger is None:
+            return self._generate_stream(prompt)
+        return self.hedger.run(lambda: self._generate_stream(prompt), until_done=until_done)
+
+    @staticmethod
+    def _collect(chunks):
+        """Join streamed chunks into (text, usage_metadata)"""
+        parts = []
+        usage = None
+        for chunk in chunks:
+            usage = chunk.usage_metadata or usage
+            if chunk.text:
+                parts.append(chunk.text)
+        return "".join(parts), usage
+
+    def _stream_upstream(self, prompt, key, method=None, semantic_text=None, upstream=None):
+        """Stream text chunks from Gemini, recording usage and filling the caches"""
+        chunks = []
+        usage = None
+        with self._slot(self._estimate_tokens(prompt), method):
+            stream = self._upstream_chunks(prompt)
+            try:
+                for chunk in stream:
+                    # Usage is cumulative, so the last chunk that reports it wins
+                    usage = chunk.usage_metadata or usage
+                    if chunk.text:
+                        chunks.append(chunk.text)
+                        yield chunk.text
+            except GeneratorExit:
+                # Every reader cancelled: drop the request and count the tokens
+                # generated so far, but don't cache the partial reply
+                stream.close()
+                self._record_usage(usage, prompt)
+                if upstream is not None:
+                    upstream['usage'] = usage
+                raise
+
+        self._record_usage(usage, prompt)
+        self._remember(key, method, semantic_text, "".join(chunks))
+        if upstream is not None:
+            upstream['usage'] = usage
+
+    def _stream_message(self, prompt, method=None, semantic_text=None):
+        """Stream a message to Gemini, yielding text chunks as they arrive"""
+        started = time.perf_counter()
+        started_at = time.time()
+        self.last_ttft = None
+
+        key, cached = self._cache_lookup(prompt, method)
+        if cached is not None:
+            self.last_ttft = time.perf_counter() - started
+            yield cached
+            self._emit(method, prompt, cached, started_at, 'cache', ttft=self.last_ttft)
+            return
+
+        similar = self._semantic_lookup(method, semantic_text)
+        if similar is not None:
+            self.last_ttft = time.perf_counter() - started
+            yield similar
+            self._emit(method, prompt, similar, started_at, 'semantic', ttft=self.last_ttft)
+            return
+
+        # Identical prompts already in flight share one upstream stream
+        upstream = {}
+        chunks = []
+        shared = self.singleflight.stream(
+            self._request_key(prompt),
+            lambda: self._stream_upstream(prompt, key, method, semantic_text, upstream)
+        )
+        try:
+            for text in shared:
+                if self.last_ttft is None:
+                    # Time-to-first-token for the latest streamed request
+                    self.last_ttft = time.perf_counter() - started
+                    self.ttft_samples.append(self.last_ttft)
+                chunks.append(text)
+                yield text
+        except (GeneratorExit, KeyboardInterrupt):
+            # Closed early or Ctrl-C; the upstream request is dropped once no
+            # other caller is reading it
+            shared.close()
+            self._emit(
+                method, prompt, "".join(chunks), started_at, 'cancelled',
+                upstream.get('usage'), self.last_ttft
+            )
+            raise
+        self._emit(
+            method, prompt, "".join(chunks), started_at,
+            'upstream' if upstream else 'coalesced', upstream.get('usage'), self.last_ttft
+        )
+    
+    def generate_hard_questions(self, topic, difficulty="expert", num_questions=5):
+        """Generate challenging data science questions"""
+        topic = self._fit_input(topic, build_questions_prompt("", difficulty, num_questions))[0]
+        prompt = build_questions_prompt(topic, difficulty, num_questions)
+        return self._send_message(prompt, method="generate_hard_questions")
+    
+    def answer_question(self, question):
+        """Answer data science questions with expert knowledge"""
+        question = self._fit_input(question, build_answer_prompt(""))[0]
+        return self._send_message(
+            build_answer_prompt(question), method="answer_question", semantic_text=question
+        )
+    
+    def review_code(self, code, context=""):
+        """Review and optimize data science code"""
+        prompts = self._review_prompts(code, context)
+        if len(prompts) == 1:
+            return self._send_message(prompts[0], method="review_code")
+        # Too large for one request: review each part in turn
+        return "\n\n".join(
+            f"## Part {i}/{len(prompts)}\n\n" + self._send_message(prompt, method="review_code")
+            for i, prompt in enumerate(prompts, 1)
+        )
+    
+    def solve_problem(self, problem_description):
+        """Solve complex data science problems"""
+        problem_description = self._fit_input(problem_description, build_problem_prompt(""))[0]
+        return self._send_message(build_problem_prompt(problem_description), method="solve_problem")
     
     def chat_with_agent(self, message):
-        """General chat with the expert agent"""
-        return self._send_message(message)
+        """General chat with the expert agent, remembering earlier turns"""
+        message = self._fit_input(message, reserved=self.memory.tokens)[0]
+        # Only an opening message can be answered from the semantic cache
+        if not self.memory.turns:
+            similar = self._semantic_lookup("chat_with_agent", message)
+            if similar is not None:
+                self._add_chat_turn(message, similar)
+                self._emit("chat_with_agent", message, similar, time.time(), 'semantic')
+                return similar
+
+        started = time.time()
+        send = self._with_recall(message)
+        tokens = self.memory.tokens + self._estimate_tokens(send)
+        with self._slot(tokens, "chat_with_agent"):
+            response = self.resilience.call(
+                lambda: self._chat_call(lambda chat: chat.send_message(send)), tokens=tokens
+            )
+        self._record_usage(response.usage_metadata)
+        if not self._add_chat_turn(message, response.text or "") and send is message:
+            # The session already holds this turn, so it stays current
+            self._chat_version = self.memory.version
+        self._emit("chat_with_agent", send, response.text, started, 'upstream', response.usage_metadata)
+        return response.text
+
+    def generate_hard_questions_stream(self, topic, difficulty="expert", num_questions=5):
+        """Stream challenging data science questions as they are generated"""
+        topic = self._fit_input(topic, build_questions_prompt("", difficulty, num_questions))[0]
+        prompt = build_questions_prompt(topic, difficulty, num_questions)
+        return self._stream_message(prompt, method="generate_hard_questions")
+
+    def answer_question_stream(self, question):
+        """Stream an expert answer to a data science question"""
+        question = self._fit_input(question, build_answer_prompt(""))[0]
+        return self._stream_message(
+            build_answer_prompt(question), method="answer_question", semantic_text=question
+        )
+
+    def review_code_stream(self, code, context=""):
+        """Stream a review of data science code"""
+        prompts = self._review_prompts(code, context)
+        if len(prompts) == 1:
+            return self._stream_message(prompts[0], method="review_code")
+        return self._stream_parts(prompts, method="review_code")
+
+    def _stream_parts(self, prompts, method=None):
+        """Stream replies to several prompts one after another, each under a part heading"""
+        for i, prompt in enumerate(prompts, 1):
+            heading = f"## Part {i}/{len(prompts)}\n\n"
+            yield heading if i == 1 else "\n\n" + heading
+            yield from self._stream_message(prompt, method=method)
+
+    def solve_problem_stream(self, problem_description):
+        """Stream a solution to a data science problem"""
+        problem_description = self._fit_input(problem_description, build_problem_prompt(""))[0]
+        return self._stream_message(build_problem_prompt(problem_description), method="solve_problem")
+
+    def chat_with_agent_stream(self, message):
+        """Stream a chat reply from the expert agent, remembering earlier turns"""
+        message = self._fit_input(message, reserved=self.memory.tokens)[0]
+        started = time.perf_counter()
+        started_at = time.time()
+        self.last_ttft = None
+
+        if not self.memory.turns:
+            similar = self._semantic_lookup("chat_with_agent", message)
+            if similar is not None:
+                self.last_ttft = time.perf_counter() - started
+                self._add_chat_turn(message, similar)
+                yield similar
+                self._emit("chat_with_agent", message, similar, started_at, 'semantic', ttft=self.last_ttft)
+                return
+
+        send = self._with_recall(message)
+
+        def open_stream(chat):
+            stream = chat.send_message_stream(send)
+            return next(stream, None), stream
+
+        tokens = self.memory.tokens + self._estimate_tokens(send)
+        with self._slot(tokens, "chat_with_agent"):
+            first, stream = self.resilience.call(lambda: self._chat_call(open_stream), tokens=tokens)
+            chunks = []
+            usage = None
+            try:
+                if first is not None:
+                    for chunk in itertools.chain([first], stream):
+                        usage = chunk.usage_metadata or usage
+                        if not chunk.text:
+                            continue
+                        if self.last_ttft is None:
+                            self.last_ttft = time.perf_counter() - started
+                            self.ttft_samples.append(self.last_ttft)
+                        chunks.append(chunk.text)
+                        yield chunk.text
+            except (GeneratorExit, KeyboardInterrupt):
+                # Cancelled mid-reply: drop the request and count what was generated.
+                # The session only records a fully consumed reply, so neither it nor
+                # the memory gets the partial turn
+                stream.close()
+                self._record_usage(usage)
+                self._emit("chat_with_agent", send, "".join(chunks), started_at, 'cancelled', usage, self.last_ttft)
+                raise
+
+        # The session records the turn only once the stream is fully consumed
+        self._record_usage(usage)
+        if not self._add_chat_turn(message, "".join(chunks)) and send is message:
+            self._chat_version = self.memory.version
+        self._emit("chat_with_agent", send, "".join(chunks), started_at, 'upstream', usage, self.last_ttft)
+
+    def _chat_session(self):
+        """Return the live chat session, rebuilding it from the remembered window when stale"""
+        if self._chat is None or self._chat_version != self.memory.version:
+            self._chat = self.client.chats.create(
+                model=self.model, config=self._config(), history=self.memory.history()
+            )
+            self._chat_version = self.memory.version
+        return self._chat
+
+    def _chat_call(self, fn):
+        """Call fn(chat), rebuilding the session once if its context cache expired"""
+        from google.genai import errors
+
+        try:
+            return fn(self._chat_session())
+        except errors.APIError as e:
+            if self.context_cache is None or not SystemPromptCache.is_cache_error(e):
+                raise
+            self.context_cache.invalidate()
+            self._chat = None
+            return fn(self._chat_session())
+
+    def _with_recall(self, message):
+        """The message to send, prefixed with relevant turns that have left the window
+
+        A session sent a prefixed message holds it in its history, so it is
+        rebuilt from the plain turns on the next message.
+        """
+        if self.recall is None:
+            return message
+        from recall import with_recalled
+        turns = self.recall.search(message, exclude_last=len(self.memory.turns))
+        return with_recalled(message, turns, self.recall.max_chars)
+
+    def _add_chat_turn(self, user, assistant):
+        """Remember a turn; returns True if the window slid and sessions must be rebuilt"""
+        first_turn = not self.memory.turns
+        # Kept so callers can give the turn its stored id and page it without a copy
+        self.last_turn = Turn(None, user, assistant)
+        slid = self.memory.append(self.last_turn)
+        if self.recall is not None:
+            self.recall.add(self.last_turn)
+        if first_turn:
+            self._remember(None, "chat_with_agent", user, assistant)
+        # The reply has been delivered; fold older turns into the summary off the request path
+        if self.summarizer is not None:
+            self.summarizer.schedule(self.memory)
+        return slid
     
+    def answer_questions_batch(self, questions, concurrency=8):
+        """Answer many questions concurrently; returns a BatchReport in input order"""
+        return run_batch(self._as_bulk(self.answer_question), questions, concurrency)
+
+    def review_code_batch(self, items, concurrency=8):
+        """Review many snippets concurrently; items are code strings or (code, context) pairs"""
+        def review(item):
+            if isinstance(item, str):
+                return self.review_code(item)
+            return self.review_code(*item)
+        return run_batch(self._as_bulk(review), items, concurrency)
+
+    def solve_problems_batch(self, problems, concurrency=8):
+        """Solve many problems concurrently; returns a BatchReport in input order"""
+        return run_batch(self._as_bulk(self.solve_problem), problems, concurrency)
+
+    @property
+    def chat_history(self):
+        """Turns in the current conversation window"""
+        return self.memory.turns
+
+    def restore_conversation(self, turns, summary="", recall_turns=None):
+        """Replace the conversation with saved turns (Turns or dicts with "user" and "assistant")
+
+        `recall_turns`, if given, is every turn of the conversation for the
+        recall index, e.g. ConversationStore.iter_turns(session_id=...);
+        otherwise only `turns` are indexed.
+        """
+        self.memory.restore(turns, summary)
+        if self.recall is not None:
+            self.recall.clear()
+            self.recall.extend(turns if recall_turns is None else recall_turns)
+        self._chat = None
+
     def reset_conversation(self):
         """Reset the chat history"""
-        self.chat_history = []
+        self.memory.clear()
+        if self.recall is not None:
+            self.recall.clear()
+        self._chat = None
         print("Conversation reset successfully!")
 
 
+def print_stream(chunks):
+    """Print streamed text chunks as they arrive; Ctrl-C cancels the request"""
+    try:
+        for chunk in chunks:
+            print(chunk, end="", flush=True)
+    except KeyboardInterrupt:
+        chunks.close()
+        print("\n\n⏹️ Cancelled.")
+        return
+    print()
+
+
 def main():
     """Main function to interact with the agent"""
+    from dotenv import load_dotenv
+    load_dotenv()
+
     print("=" * 70)
     print("🤖 DATA SCIENCE EXPERT AI AGENT")
     print("=" * 70)
@@ -170,57 +879,56 @@ def main():
             
             choice = input("\nEnter your choice (1-7): ").strip()
             
-            if choice == '1':
-                topic = input("\nEnter topic: ")
-                num = input("Number of questions (default 5): ").strip()
-                num = int(num) if num else 5
+            try:
+                if choice == '1':
+                    topic = input("\nEnter topic: ")
+                    num = input("Number of questions (default 5): ").strip()
+                    num = int(num) if num else 5
                 
-                print("\n🔄 Generating questions...\n")
-                result = agent.generate_hard_questions(topic, num_questions=num)
-                print(result)
+                    print("\n🔄 Generating questions...\n")
+                    print_stream(agent.generate_hard_questions_stream(topic, num_questions=num))
                 
-            elif choice == '2':
-                question = input("\nEnter your question: ")
-                print("\n🔄 Processing...\n")
-                result = agent.answer_question(question)
-                print(result)
+                elif choice == '2':
+                    question = input("\nEnter your question: ")
+                    print("\n🔄 Processing...\n")
+                    print_stream(agent.answer_question_stream(question))
                 
-            elif choice == '3':
-                print("\nEnter your code (press Enter twice when done):")
-                lines = []
-                while True:
-                    line = input()
-                    if line == "" and lines and lines[-1] == "":
-                        break
-                    lines.append(line)
-                code = "\n".join(lines[:-1])
+                elif choice == '3':
+                    print("\nEnter your code (press Enter twice when done):")
+                    lines = []
+                    while True:
+                        line = input()
+                        if line == "" and lines and lines[-1] == "":
+                            break
+                        lines.append(line)
+                    code = "\n".join(lines[:-1])
                 
-                context = input("\nContext (optional): ")
-                print("\n🔄 Reviewing code...\n")
-                result = agent.review_code(code, context)
-                print(result)
+                    context = input("\nContext (optional): ")
+                    print("\n🔄 Reviewing code...\n")
+                    print_stream(agent.review_code_stream(code, context))
                 
-            elif choice == '4':
-                problem = input("\nDescribe your problem: ")
-                print("\n🔄 Solving problem...\n")
-                result = agent.solve_problem(problem)
-                print(result)
+                elif choice == '4':
+                    problem = input("\nDescribe your problem: ")
+                    print("\n🔄 Solving problem...\n")
+                    print_stream(agent.solve_problem_stream(problem))
                 
-            elif choice == '5':
-                message = input("\nYour message: ")
-                print("\n🔄 Processing...\n")
-                result = agent.chat_with_agent(message)
-                print(result)
+                elif choice == '5':
+                    message = input("\nYour message: ")
+                    print("\n🔄 Processing...\n")
+                    print_stream(agent.chat_with_agent_stream(message))
                 
-            elif choice == '6':
-                agent.reset_conversation()
+                elif choice == '6':
+                    agent.reset_conversation()
                 
-            elif choice == '7':
-                print("\n👋 Thank you for using Data Science Expert AI Agent!")
-                break
+                elif choice == '7':
+                    print("\n👋 Thank you for using Data Science Expert AI Agent!")
+                    break
                 
-            else:
-                print("\n❌ Invalid choice. Please try again.")
+                else:
+                    print("\n❌ Invalid choice. Please try again.")
+            except PromptTooLargeError as e:
+                # Too much input for one request; report it and stay in the menu
+                print(f"\n❌ {e}")
                 
     except Exception as e:
         print(f"\n❌ Error: {str(e)}")
@@ -0,0 +1,368 @@
+import asyncio
+import time
+from context_cache import SystemPromptCache
+from agent import (
+    DataScienceExpertAgent,
+    build_answer_prompt,
+    build_problem_prompt,
+    build_questions_prompt,
+)
+
+
+async def _prepend(first, stream):
+    """Yield `first` followed by the rest of an async stream"""
+    yield first
+    async for chunk in stream:
+        yield chunk
+
+
+async def _close(stream):
+    """Close an SDK stream, releasing its HTTP response; None is ignored"""
+    if stream is not None:
+        await stream.aclose()
+
+
+class AsyncDataScienceExpertAgent:
+    """Asyncio counterpart of DataScienceExpertAgent built on client.aio"""
+
+    def __init__(self, agent=None, max_concurrency=64, **agent_kwargs):
+        """Wrap a DataScienceExpertAgent (created if not given) for async use"""
+        # Share the client, prompts, generation config and cache with the sync agent
+        self.agent = agent if agent is not None else DataScienceExpertAgent(**agent_kwargs)
+        self.client = self.agent.client
+
+        # Upper bound on concurrent upstream calls from this agent
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+        # Tasks currently holding an upstream call, for cancel_all()
+        self._tasks = set()
+
+        # Async chat session over the wrapped agent's conversational memory
+        self._chat = None
+        self._chat_version = None
+
+    @property
+    def in_flight(self):
+        """Number of upstream calls currently running"""
+        return len(self._tasks)
+
+    def _track(self):
+        """Register the current task as in flight"""
+        task = asyncio.current_task()
+        if task is not None:
+            self._tasks.add(task)
+        return task
+
+    async def _generate(self, contents):
+        """Call generate_content with retries, rate limiting and circuit breaking"""
+        return await self.agent.resilience.acall(
+            lambda: self._generate_once(contents), tokens=self.agent._estimate_tokens(contents)
+        )
+
+    async def _generate_once(self, contents):
+        """Call generate_content, falling back to a plain system instruction if the context cache expired"""
+        from google.genai import errors
+
+        try:
+            return await self.client.aio.models.generate_content(
+                model=self.agent.model, contents=contents, config=self.agent._config(contents)
+            )
+        except errors.APIError as e:
+            if self.agent.context_cache is None or not SystemPromptCache.is_cache_error(e):
+                raise
+            self.agent.context_cache.invalidate()
+            return await self.client.aio.models.generate_content(
+                model=self.agent.model, contents=contents, config=self.agent._config(contents)
+            )
+
+    async def _open_stream(self, contents):
+        """Start generate_content_stream and return (first chunk, stream)"""
+        from google.genai import errors
+
+        try:
+            stream = await self.client.aio.models.generate_content_stream(
+                model=self.agent.model, contents=contents, config=self.agent._config(contents)
+            )
+            first = await anext(stream, None)
+        except errors.APIError as e:
+            if self.agent.context_cache is None or not SystemPromptCache.is_cache_error(e):
+                raise
+            self.agent.context_cache.invalidate()
+            stream = await self.client.aio.models.generate_content_stream(
+                model=self.agent.model, contents=contents, config=self.agent._config(contents)
+            )
+            first = await anext(stream, None)
+        return first, stream
+
+    async def _send_message(self, prompt, method=None, semantic_text=None):
+        """Send message to Gemini without blocking the event loop"""
+        started = time.time()
+        key, cached = self.agent._cache_lookup(prompt, method)
+        if cached is not None:
+            self.agent._emit(method, prompt, cached, started, 'cache')
+            return cached
+
+        # Embedding may hit the network, so keep it off the event loop
+        similar = await asyncio.to_thread(self.agent._semantic_lookup, method, semantic_text)
+        if similar is not None:
+            self.agent._emit(method, prompt, similar, started, 'semantic')
+            return similar
+
+        slot = self.agent._aslot(self.agent._estimate_tokens(prompt), method)
+        async with slot, self._semaphore:
+            task = self._track()
+            try:
+                response = await self._generate(prompt)
+            finally:
+                self._tasks.discard(task)
+
+        self.agent._record_usage(response.usage_metadata, prompt)
+        await asyncio.to_thread(self.agent._remember, key, method, semantic_text, response.text)
+        self.agent._emit(method, prompt, response.text, started, 'upstream', response.usage_metadata)
+
+        return response.text
+
+    async def _stream_message(self, prompt, method=None, semantic_text=None):
+        """Stream a message to Gemini, yielding text chunks as they arrive"""
+        started = time.perf_counter()
+        started_at = time.time()
+
+        key, cached = self.agent._cache_lookup(prompt, method)
+        if cached is not None:
+            yield cached
+            self.agent._emit(method, prompt, cached, started_at, 'cache')
+            return
+
+        similar = await asyncio.to_thread(self.agent._semantic_lookup, method, semantic_text)
+        if similar is not None:
+            yield similar
+            self.agent._emit(method, prompt, similar, started_at, 'semantic')
+            return
+
+        chunks = []
+        usage = None
+        ttft = None
+        stream = None
+        slot = self.agent._aslot(self.agent._estimate_tokens(prompt), method)
+        async with slot, self._semaphore:
+            task = self._track()
+            try:
+                # Only the request up to the first chunk is retried
+                first, stream = await self.agent.resilience.acall(
+                    lambda: self._open_stream(prompt), tokens=self.agent._estimate_tokens(prompt)
+                )
+                if first is not None:
+                    async for chunk in _prepend(first, stream):
+                        usage = chunk.usage_metadata or usage
+                        if not chunk.text:
+                            continue
+                        if not chunks:
+                            ttft = self.agent.last_ttft = time.perf_counter() - started
+                            self.agent.ttft_samples.append(ttft)
+                        chunks.append(chunk.text)
+                        yield chunk.text
+            except (asyncio.CancelledError, GeneratorExit):
+                # Task cancelled or stream closed early: drop the request and
+                # count the tokens generated so far, without caching them
+                await _close(stream)
+                self.agent._record_usage(usage, prompt)
+                self.agent._emit(method, prompt, "".join(chunks), started_at, 'cancelled', usage, ttft)
+                raise
+            finally:
+                self._tasks.discard(task)
+
+        self.agent._record_usage(usage, prompt)
+        await asyncio.to_thread(self.agent._remember, key, method, semantic_text, "".join(chunks))
+        self.agent._emit(method, prompt, "".join(chunks), started_at, 'upstream', usage, ttft)
+
+    def cancel_all(self):
+        """Cancel every in-flight upstream call and return how many were cancelled"""
+        tasks = [task for task in self._tasks if not task.done()]
+        for task in tasks:
+            task.cancel()
+        return len(tasks)
+
+    async def aclose(self):
+        """Close the async HTTP client"""
+        await self.client.aio.aclose()
+
+    async def generate_hard_questions(self, topic, difficulty="expert", num_questions=5):
+        """Generate challenging data science questions"""
+        topic = self.agent._fit_input(topic, build_questions_prompt("", difficulty, num_questions))[0]
+        prompt = build_questions_prompt(topic, difficulty, num_questions)
+        return await self._send_message(prompt, method="generate_hard_questions")
+
+    async def answer_question(self, question):
+        """Answer data science questions with expert knowledge"""
+        question = self.agent._fit_input(question, build_answer_prompt(""))[0]
+        return await self._send_message(
+            build_answer_prompt(question), method="answer_question", semantic_text=question
+        )
+
+    async def review_code(self, code, context=""):
+        """Review and optimize data science code"""
+        prompts = self.agent._review_prompts(code, context)
+        if len(prompts) == 1:
+            return await self._send_message(prompts[0], method="review_code")
+        # Too large for one request: review the parts concurrently
+        reviews = await asyncio.gather(
+            *(self._send_message(prompt, method="review_code") for prompt in prompts)
+        )
+        return "\n\n".join(
+            f"## Part {i}/{len(prompts)}\n\n{review}" for i, review in enumerate(reviews, 1)
+        )
+
+    async def solve_problem(self, problem_description):
+        """Solve complex data science problems"""
+        problem_description = self.agent._fit_input(problem_description, build_problem_prompt(""))[0]
+        return await self._send_message(build_problem_prompt(problem_description), method="solve_problem")
+
+    async def chat_with_agent(self, message):
+        """General chat with the expert agent, remembering earlier turns"""
+        memory = self.agent.memory
+        message = self.agent._fit_input(message, reserved=memory.tokens)[0]
+        started = time.time()
+        if not memory.turns:
+            similar = await asyncio.to_thread(self.agent._semantic_lookup, "chat_with_agent", message)
+            if similar is not None:
+                self.agent._add_chat_turn(message, similar)
+                self.agent._emit("chat_with_agent", message, similar, started, 'semantic')
+                return similar
+
+        # Embedding may hit the network, so keep recall off the event loop
+        send = await asyncio.to_thread(self.agent._with_recall, message)
+        tokens = memory.tokens + self.agent._estimate_tokens(send)
+        async with self.agent._aslot(tokens, "chat_with_agent"), self._semaphore:
+            task = self._track()
+            try:
+                response = await self.agent.resilience.acall(
+                    lambda: self._chat_call(lambda chat: chat.send_message(send)), tokens=tokens
+                )
+            finally:
+                self._tasks.discard(task)
+
+        self.agent._record_usage(response.usage_metadata)
+        if not self.agent._add_chat_turn(message, response.text or "") and send is message:
+            self._chat_version = memory.version
+        self.agent._emit("chat_with_agent", send, response.text, started, 'upstream', response.usage_metadata)
+        return response.text
+
+    def _chat_session(self):
+        """Return the async chat session, rebuilding it from the shared memory when stale"""
+        memory = self.agent.memory
+        if self._chat is None or self._chat_version != memory.version:
+            self._chat = self.client.aio.chats.create(
+                model=self.agent.model, config=self.agent._config(), history=memory.history()
+            )
+            self._chat_version = memory.version
+        return self._chat
+
+    async def _chat_call(self, fn):
+        """Await fn(chat), rebuilding the session once if its context cache expired"""
+        from google.genai import errors
+
+        try:
+            return await fn(self._chat_session())
+        except errors.APIError as e:
+            if self.agent.context_cache is None or not SystemPromptCache.is_cache_error(e):
+                raise
+            self.agent.context_cache.invalidate()
+            self._chat = None
+            return await fn(self._chat_session())
+
+    def generate_hard_questions_stream(self, topic, difficulty="expert", num_questions=5):
+        """Stream challenging data science questions as they are generated"""
+        topic = self.agent._fit_input(topic, build_questions_prompt("", difficulty, num_questions))[0]
+        prompt = build_questions_prompt(topic, difficulty, num_questions)
+        return self._stream_message(prompt, method="generate_hard_questions")
+
+    def answer_question_stream(self, question):
+        """Stream an expert answer to a data science question"""
+        question = self.agent._fit_input(question, build_answer_prompt(""))[0]
+        return self._stream_message(
+            build_answer_prompt(question), method="answer_question", semantic_text=question
+        )
+
+    def review_code_stream(self, code, context=""):
+        """Stream a review of data science code"""
+        prompts = self.agent._review_prompts(code, context)
+        if len(prompts) == 1:
+            return self._stream_message(prompts[0], method="review_code")
+        return self._stream_parts(prompts, method="review_code")
+
+    async def _stream_parts(self, prompts, method=None):
+        """Stream replies to several prompts one after another, each under a part heading"""
+        for i, prompt in enumerate(prompts, 1):
+            heading = f"## Part {i}/{len(prompts)}\n\n"
+            yield heading if i == 1 else "\n\n" + heading
+            async for text in self._stream_message(prompt, method=method):
+                yield text
+
+    def solve_problem_stream(self, problem_description):
+        """Stream a solution to a data science problem"""
+        problem_description = self.agent._fit_input(problem_description, build_problem_prompt(""))[0]
+        return self._stream_message(build_problem_prompt(problem_description), method="solve_problem")
+
+    async def chat_with_agent_stream(self, message):
+        """Stream a chat reply from the expert agent, remembering earlier turns"""
+        started = time.perf_counter()
+        started_at = time.time()
+        memory = self.agent.memory
+        message = self.agent._fit_input(message, reserved=memory.tokens)[0]
+        if not memory.turns:
+            similar = await asyncio.to_thread(self.agent._semantic_lookup, "chat_with_agent", message)
+            if similar is not None:
+                self.agent.last_ttft = time.perf_counter() - started
+                self.agent._add_chat_turn(message, similar)
+                yield similar
+                self.agent._emit(
+                    "chat_with_agent", message, similar, started_at, 'semantic', ttft=self.agent.last_ttft
+                )
+                return
+
+        send = await asyncio.to_thread(self.agent._with_recall, message)
+
+        async def open_stream(chat):
+            stream = await chat.send_message_stream(send)
+            return await anext(stream, None), stream
+
+        chunks = []
+        usage = None
+        stream = None
+        tokens = memory.tokens + self.agent._estimate_tokens(send)
+        async with self.agent._aslot(tokens, "chat_with_agent"), self._semaphore:
+            task = self._track()
+            try:
+                first, stream = await self.agent.resilience.acall(
+                    lambda: self._chat_call(open_stream), tokens=tokens
+                )
+                if first is not None:
+                    async for chunk in _prepend(first, stream):
+                        usage = chunk.usage_metadata or usage
+                        if not chunk.text:
+                            continue
+                        if not chunks:
+                            self.agent.last_ttft = time.perf_counter() - started
+                            self.agent.ttft_samples.append(self.agent.last_ttft)
+                        chunks.append(chunk.text)
+                        yield chunk.text
+            except (asyncio.CancelledError, GeneratorExit):
+                # The session only records a fully consumed reply, so the
+                # partial turn is left out of it and out of the memory
+                await _close(stream)
+                self.agent._record_usage(usage)
+                self.agent._emit(
+                    "chat_with_agent", send, "".join(chunks), started_at, 'cancelled',
+                    usage, self.agent.last_ttft
+                )
+                raise
+            finally:
+                self._tasks.discard(task)
+
+        self.agent._record_usage(usage)
+        if not self.agent._add_chat_turn(message, "".join(chunks)) and send is message:
+            self._chat_version = memory.version
+        self.agent._emit(
+            "chat_with_agent", send, "".join(chunks), started_at, 'upstream', usage, self.agent.last_ttft
+        )
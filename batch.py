@@ -0,0 +1,90 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class BatchResult:
+    """Outcome of a single item in a batch run"""
+
+    def __init__(self, index, item, output=None, error=None, elapsed=0.0):
+        """Record the item, its output or error, and how long it took"""
+        self.index = index
+        self.item = item
+        self.output = output
+        self.error = error
+        self.elapsed = elapsed
+
+    @property
+    def ok(self):
+        """True if the item completed without an error"""
+        return self.error is None
+
+    def __repr__(self):
+        status = "ok" if self.ok else f"error={self.error!r}"
+        return f"BatchResult(index={self.index}, {status}, elapsed={self.elapsed:.2f}s)"
+
+
+class BatchReport:
+    """Ordered batch results plus aggregate throughput"""
+
+    def __init__(self, results, elapsed):
+        """Wrap per-item results and the wall-clock time of the batch"""
+        self.results = results
+        self.elapsed = elapsed
+
+    @property
+    def succeeded(self):
+        """Number of items that completed"""
+        return sum(1 for result in self.results if result.ok)
+
+    @property
+    def failed(self):
+        """Number of items that raised"""
+        return len(self.results) - self.succeeded
+
+    @property
+    def throughput(self):
+        """Completed items per second over the whole batch"""
+        return len(self.results) / self.elapsed if self.elapsed else 0.0
+
+    def outputs(self):
+        """Return outputs in input order, with None for failed items"""
+        return [result.output for result in self.results]
+
+    def summary(self):
+        """Return aggregate counters for logging"""
+        return {
+            'items': len(self.results),
+            'succeeded': self.succeeded,
+            'failed': self.failed,
+            'elapsed': self.elapsed,
+            'throughput': self.throughput,
+        }
+
+    def __iter__(self):
+        return iter(self.results)
+
+    def __len__(self):
+        return len(self.results)
+
+
+def run_batch(fn, items, concurrency=8):
+    """Apply fn to every item over a bounded thread pool, preserving input order"""
+    items = list(items)
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+
+    def run_one(index, item):
+        started = time.perf_counter()
+        try:
+            output = fn(item)
+            return BatchResult(index, item, output=output, elapsed=time.perf_counter() - started)
+        except Exception as e:
+            # Record the failure and keep the rest of the batch going
+            return BatchResult(index, item, error=e, elapsed=time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=min(concurrency, max(len(items), 1))) as pool:
+        futures = [pool.submit(run_one, index, item) for index, item in enumerate(items)]
+        results = [future.result() for future in futures]
+
+    return BatchReport(results, time.perf_counter() - started)
@@ -0,0 +1,138 @@
+import threading
+from tokens import estimate_tokens
+from turn_history import Turn, as_turn
+
+
+def _turn_tokens(turn):
+    return estimate_tokens(turn["user"]) + estimate_tokens(turn["assistant"])
+
+
+class ChatMemory:
+    """Conversation turns for a chat session, kept within a token budget
+
+    Turns are Turn records, shared with the session's TurnHistory rather
+    than copied, and are appended as the conversation goes. Once the window
+    passes `summarize_at` of the budget, older turns become eligible to be folded
+    into a running summary (see summarizer.py), keeping the newest
+    `keep_recent` turns verbatim. If summarization falls behind and the
+    window exceeds `token_budget`, the oldest turns are dropped until it is
+    back under `low_water` of the budget. Either way the chat session only
+    has to be rebuilt occasionally rather than on every turn.
+    """
+
+    def __init__(self, token_budget=16000, low_water=0.75, summarize_at=0.5, keep_recent=4):
+        """Create an empty memory with the given history budget in tokens"""
+        self.token_budget = token_budget
+        self.low_water = low_water
+        self.summarize_at = summarize_at
+        self.keep_recent = keep_recent
+        self.turns = []
+        self.summary = ""
+        self.dropped_turns = 0
+        self.summarized_turns = 0
+        # Bumped on every change so chat sessions can tell they are stale
+        self.version = 0
+        self.summarizing = False
+        self._tokens = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.turns)
+
+    @property
+    def tokens(self):
+        """Estimated tokens in the current window, including the summary"""
+        return self._tokens
+
+    def add(self, user, assistant):
+        """Append a turn; returns True if older turns were dropped from the window"""
+        return self.append(Turn(None, user, assistant))
+
+    def append(self, turn):
+        """Append a Turn (or turn dict); returns True if older turns were dropped from the window"""
+        with self._lock:
+            turn = as_turn(turn)
+            self.turns.append(turn)
+            self.version += 1
+            self._tokens += _turn_tokens(turn)
+            if self._tokens <= self.token_budget:
+                return False
+
+            target = self.token_budget * self.low_water
+            # Always keep the newest turn, even if it alone exceeds the budget
+            while len(self.turns) > 1 and self._tokens > target:
+                self._tokens -= _turn_tokens(self.turns.pop(0))
+                self.dropped_turns += 1
+            return True
+
+    def claim_foldable(self):
+        """Return the turns to fold into the summary, or None if none are due
+
+        The caller owns the fold until it calls apply_summary() or
+        release(); only one fold runs at a time.
+        """
+        with self._lock:
+            if self.summarizing or self._tokens <= self.token_budget * self.summarize_at:
+                return None
+            foldable = self.turns[:-self.keep_recent] if self.keep_recent else list(self.turns)
+            if not foldable:
+                return None
+            self.summarizing = True
+            return list(foldable)
+
+    def apply_summary(self, summary, folded):
+        """Replace the folded turns with the new summary, if they are still in the window"""
+        with self._lock:
+            self.summarizing = False
+            # Turns may have been dropped or cleared while the summary was written
+            count = len(folded)
+            if len(self.turns) < count or any(
+                current is not turn for current, turn in zip(self.turns, folded)
+            ):
+                return False
+            del self.turns[:count]
+            self.summary = summary
+            self.summarized_turns += count
+            self._tokens = estimate_tokens(summary) + sum(_turn_tokens(turn) for turn in self.turns)
+            self.version += 1
+            return True
+
+    def release(self):
+        """Give up a claimed fold without changing the window"""
+        with self._lock:
+            self.summarizing = False
+
+    def history(self):
+        """Return the summary and window as SDK chat history"""
+        from google.genai import types
+
+        with self._lock:
+            contents = []
+            if self.summary:
+                contents.append(types.Content(role="user", parts=[types.Part(
+                    text="Summary of our conversation so far:\n\n" + self.summary
+                )]))
+                contents.append(types.Content(role="model", parts=[types.Part(
+                    text="Understood. I'll keep that context in mind."
+                )]))
+            for turn in self.turns:
+                contents.append(types.Content(role="user", parts=[types.Part(text=turn["user"])]))
+                contents.append(types.Content(role="model", parts=[types.Part(text=turn["assistant"])]))
+            return contents
+
+    def restore(self, turns, summary=""):
+        """Replace the window with saved turns (oldest first) and summary"""
+        with self._lock:
+            self.clear()
+            self.summary = summary
+            self._tokens = estimate_tokens(summary) if summary else 0
+            for turn in turns:
+                self.append(turn)
+
+    def clear(self):
+        """Forget every turn and the summary"""
+        with self._lock:
+            self.turns = []
+            self.summary = ""
+            self.version += 1
+            self._tokens = 0
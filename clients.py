@@ -0,0 +1,89 @@
+import threading
+import time
+
+# One client (and HTTP connection pool) per configuration for the whole process
+_clients = {}
+_lock = threading.Lock()
+
+
+class LazyClient:
+    """Stand-in for genai.Client that imports the SDK and builds the client on first use
+
+    Importing google.genai takes most of a second, so agents and app workers
+    hold one of these and only pay for it when the first request is made.
+    """
+
+    def __init__(self, factory):
+        """Wrap `factory`, a callable returning the real client"""
+        self._factory = factory
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    def _get(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._factory()
+        return self._client
+
+    def __getattr__(self, name):
+        # Only called for attributes not set in __init__, i.e. the client's own
+        return getattr(self._get(), name)
+
+
+def new_client(api_key):
+    """Create a lazily constructed genai.Client for `api_key`"""
+    def create():
+        from google import genai
+        return genai.Client(api_key=api_key)
+    return LazyClient(create)
+
+
+def get_shared_client(api_key, max_connections=100, max_keepalive_connections=20,
+                      keepalive_expiry=60.0):
+    """Return a process-wide genai.Client, creating it on first use
+
+    The underlying httpx pools keep connections alive between requests, so
+    callers in different threads or Streamlit sessions reuse warm TLS
+    connections instead of opening their own.
+    """
+    def create():
+        import httpx
+        from google import genai
+        from google.genai import types
+
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        return genai.Client(
+            api_key=api_key,
+            http_options=types.HttpOptions(
+                client_args={'limits': limits},
+                async_client_args={'limits': limits},
+            ),
+        )
+
+    key = (api_key, max_connections, max_keepalive_connections, keepalive_expiry)
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = LazyClient(create)
+        return client
+
+
+def warm_up(client, model='gemini-2.5-flash'):
+    """Open a pooled connection with a cheap metadata request; returns seconds taken or None"""
+    started = time.perf_counter()
+    try:
+        client.models.get(model=model)
+    except Exception:
+        # Warm-up is best effort; the first real request will surface any error
+        return None
+    return time.perf_counter() - started
+
+
+def warm_up_in_background(client, model='gemini-2.5-flash'):
+    """Run warm_up() on a daemon thread so the SDK import and handshake don't block startup"""
+    threading.Thread(target=warm_up, args=(client, model), daemon=True, name="warm-up").start()
@@ -0,0 +1,123 @@
+import threading
+import time
+from tokens import estimate_tokens
+
+# Smallest system prompt Gemini accepts for explicit caching (2.5 Flash)
+MIN_CACHE_TOKENS = 1024
+
+
+class SystemPromptCache:
+    """Explicit Gemini context cache holding the shared system prompt
+
+    One instance should be shared by every agent in the process, since each
+    cache is registered and billed for storage server-side. Prompts under
+    `min_tokens` (estimated) can't be cached explicitly, so the cache is
+    never created for them and the prompt is sent as a system instruction.
+    """
+
+    def __init__(self, client, model, system_prompt, ttl=3600, refresh_margin=300,
+                 retry_after=600, min_tokens=MIN_CACHE_TOKENS):
+        """Configure the cache; the cached content is created lazily on first use"""
+        self.client = client
+        self.model = model
+        self.system_prompt = system_prompt
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self.retry_after = retry_after
+
+        self.name = None
+        self.expires_at = 0.0
+        self.last_error = None
+        self.creates = 0
+        self.refreshes = 0
+        self.fallbacks = 0
+
+        self._next_attempt = 0.0
+        self._lock = threading.Lock()
+
+        self.prompt_tokens = estimate_tokens(system_prompt)
+        self.too_small = self.prompt_tokens < min_tokens
+        if self.too_small:
+            self.last_error = (
+                f"system prompt is ~{self.prompt_tokens} tokens, below the {min_tokens}-token"
+                " minimum for explicit caching; sending it as a system instruction instead"
+            )
+            print(f"[context cache] {self.last_error}", flush=True)
+
+    def config_kwargs(self):
+        """Return GenerateContentConfig kwargs that carry the system prompt"""
+        name = self._ensure()
+        if name:
+            return {'cached_content': name}
+        # Cache unavailable: send the prompt as a plain system instruction
+        self.fallbacks += 1
+        return {'system_instruction': self.system_prompt}
+
+    def _ensure(self):
+        """Create or refresh the cached content, returning its name or None"""
+        if self.too_small:
+            return None
+        now = time.time()
+        with self._lock:
+            if self.name and now < self.expires_at - self.refresh_margin:
+                return self.name
+            if now < self._next_attempt:
+                return None
+
+            try:
+                from google.genai import types
+
+                if self.name and now < self.expires_at:
+                    # Extend the TTL of the live cache before it runs out
+                    self.client.caches.update(
+                        name=self.name,
+                        config=types.UpdateCachedContentConfig(ttl=f"{self.ttl}s"),
+                    )
+                    self.refreshes += 1
+                else:
+                    cached = self.client.caches.create(
+                        model=self.model,
+                        config=types.CreateCachedContentConfig(
+                            display_name="data-science-expert-system-prompt",
+                            system_instruction=self.system_prompt,
+                            ttl=f"{self.ttl}s",
+                        ),
+                    )
+                    self.name = cached.name
+                    self.creates += 1
+                self.expires_at = now + self.ttl
+                self.last_error = None
+                return self.name
+            except Exception as e:
+                # Prompts below the model's minimum cacheable size, quota errors and
+                # expired caches all land here; retry later instead of on every call
+                self.name = None
+                self.expires_at = 0.0
+                self.last_error = str(e)
+                self._next_attempt = now + self.retry_after
+                return None
+
+    def invalidate(self):
+        """Forget the current cache, e.g. after the server reports it expired"""
+        with self._lock:
+            self.name = None
+            self.expires_at = 0.0
+
+    @staticmethod
+    def is_cache_error(error):
+        """Return True if an API error was caused by missing or expired cached content"""
+        code = getattr(error, 'code', None)
+        message = str(getattr(error, 'message', '') or error).lower()
+        return code in (400, 403, 404) and 'cache' in message
+
+    def stats(self):
+        """Return cache lifecycle counters"""
+        return {
+            'name': self.name,
+            'expires_in': max(self.expires_at - time.time(), 0.0) if self.name else 0.0,
+            'creates': self.creates,
+            'refreshes': self.refreshes,
+            'fallbacks': self.fallbacks,
+            'last_error': self.last_error,
+            'too_small': self.too_small,
+        }
@@ -0,0 +1,351 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+
+# Columns of a call record, as produced by DataScienceExpertAgent.recorder
+ARTIFACT_COLUMNS = (
+    "session_id", "method", "model", "prompt", "response", "source", "created",
+    "latency", "ttft", "prompt_tokens", "cached_tokens", "output_tokens",
+)
+
+
+def _fts_query(text):
+    """Quote each word so user input is matched literally rather than parsed as FTS syntax"""
+    terms = ['"' + term.replace('"', '""') + '"' for term in text.split()]
+    return " ".join(terms)
+
+
+class ConversationStore:
+    """Persistent chat history in SQLite with full-text search over every session
+
+    Turns are appended one at a time and read back a page at a time, newest
+    first, so a long conversation never has to be loaded whole. An FTS5 index
+    over user and assistant text is kept in sync by triggers.
+    """
+
+    def __init__(self, path="conversations.sqlite3"):
+        """Open (or create) the conversation database at `path`"""
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # WAL lets readers in other sessions proceed while a turn is written
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY,
+                title TEXT NOT NULL DEFAULT '',
+                created REAL NOT NULL,
+                updated REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS turns (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL REFERENCES sessions (id) ON DELETE CASCADE,
+                user TEXT NOT NULL,
+                assistant TEXT NOT NULL,
+                created REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS turns_session ON turns (session_id, id);
+            CREATE TABLE IF NOT EXISTS artifacts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT,
+                method TEXT,
+                model TEXT,
+                prompt TEXT NOT NULL,
+                response TEXT NOT NULL,
+                source TEXT,
+                created REAL NOT NULL,
+                latency REAL,
+                ttft REAL,
+                prompt_tokens INTEGER,
+                cached_tokens INTEGER,
+                output_tokens INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS turn_vectors (
+                turn_id INTEGER NOT NULL REFERENCES turns (id) ON DELETE CASCADE,
+                embedder TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (turn_id, embedder)
+            );
+            CREATE TABLE IF NOT EXISTS session_state (
+                session_id TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                saved REAL NOT NULL
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS turns_fts USING fts5 (
+                user, assistant, content='turns', content_rowid='id'
+            );
+            CREATE TRIGGER IF NOT EXISTS turns_ai AFTER INSERT ON turns BEGIN
+                INSERT INTO turns_fts (rowid, user, assistant)
+                VALUES (new.id, new.user, new.assistant);
+            END;
+            CREATE TRIGGER IF NOT EXISTS turns_ad AFTER DELETE ON turns BEGIN
+                INSERT INTO turns_fts (turns_fts, rowid, user, assistant)
+                VALUES ('delete', old.id, old.user, old.assistant);
+            END;
+        """)
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.commit()
+
+    @staticmethod
+    def new_session_id():
+        """Return an id for a new conversation; it is stored with its first turn"""
+        return uuid.uuid4().hex
+
+    def has_session(self, session_id):
+        """True if a conversation with this id exists"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+        return row is not None
+
+    def append(self, session_id, user, assistant):
+        """Append one turn to a conversation and return the turn id"""
+        now = time.time()
+        with self._lock:
+            # The first message doubles as the conversation title
+            self._conn.execute(
+                "INSERT INTO sessions (id, title, created, updated) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (id) DO UPDATE SET updated = excluded.updated,"
+                " title = CASE WHEN sessions.title = '' THEN excluded.title ELSE sessions.title END",
+                (session_id, user[:80], now, now),
+            )
+            cursor = self._conn.execute(
+                "INSERT INTO turns (session_id, user, assistant, created) VALUES (?, ?, ?, ?)",
+                (session_id, user, assistant, now),
+            )
+            self._conn.commit()
+        return cursor.lastrowid
+
+    def recent(self, session_id, limit=20, before=None):
+        """Return up to `limit` turns, oldest first, ending just before turn id `before`
+
+        Pass the id of the oldest turn already shown as `before` to page
+        further back.
+        """
+        query = "SELECT id, user, assistant, created FROM turns WHERE session_id = ?"
+        params = [session_id]
+        if before is not None:
+            query += " AND id < ?"
+            params.append(before)
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [
+            {"id": id_, "user": user, "assistant": assistant, "created": created}
+            for id_, user, assistant, created in reversed(rows)
+        ]
+
+    def turns_by_id(self, ids):
+        """Return the turns with these ids, oldest first; ids no longer stored are skipped"""
+        ids = list(ids)
+        if not ids:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, user, assistant, created FROM turns"
+                f" WHERE id IN ({', '.join('?' * len(ids))}) ORDER BY id",
+                ids,
+            ).fetchall()
+        return [
+            {"id": id_, "user": user, "assistant": assistant, "created": created}
+            for id_, user, assistant, created in rows
+        ]
+
+    def save_vectors(self, embedder, vectors):
+        """Store turn embeddings, (turn id, bytes) pairs made by `embedder`, so they aren't recomputed"""
+        rows = [(turn_id, embedder, vector) for turn_id, vector in vectors]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO turn_vectors (turn_id, embedder, vector) VALUES (?, ?, ?)", rows
+            )
+            self._conn.commit()
+
+    def iter_turn_vectors(self, session_id, embedder, page=1000):
+        """Yield a conversation's turns, oldest first, with their stored `embedder` vector
+
+        Turns with a vector come without their text; the rest have "vector"
+        None and carry "user" and "assistant" to be embedded.
+        """
+        last_id = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT turns.id, turn_vectors.vector,"
+                    " CASE WHEN turn_vectors.vector IS NULL THEN turns.user END,"
+                    " CASE WHEN turn_vectors.vector IS NULL THEN turns.assistant END"
+                    " FROM turns LEFT JOIN turn_vectors"
+                    " ON turn_vectors.turn_id = turns.id AND turn_vectors.embedder = ?"
+                    " WHERE turns.session_id = ? AND turns.id > ? ORDER BY turns.id LIMIT ?",
+                    (embedder, session_id, last_id, page),
+                ).fetchall()
+            for id_, vector, user, assistant in rows:
+                yield {"id": id_, "vector": vector, "user": user, "assistant": assistant}
+            if len(rows) < page:
+                return
+            last_id = rows[-1][0]
+
+    def count(self, session_id):
+        """Number of turns in a conversation"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM turns WHERE session_id = ?", (session_id,)
+            ).fetchone()[0]
+
+    def sessions(self, limit=20):
+        """Return the most recently active conversations"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, title, created, updated FROM sessions ORDER BY updated DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [
+            {"id": id_, "title": title, "created": created, "updated": updated}
+            for id_, title, created, updated in rows
+        ]
+
+    def search(self, text, limit=20, session_id=None, session_ids=None):
+        """Full-text search over every turn, best matches first
+
+        Pass `session_id` or a collection of `session_ids` to search only
+        those conversations.
+        """
+        query = _fts_query(text)
+        if session_ids is not None:
+            session_ids = list(session_ids)
+        if not query or session_ids == []:
+            return []
+        sql = (
+            "SELECT turns.id, turns.session_id, sessions.title, turns.created,"
+            " snippet(turns_fts, -1, '**', '**', '…', 12)"
+            " FROM turns_fts"
+            " JOIN turns ON turns.id = turns_fts.rowid"
+            " JOIN sessions ON sessions.id = turns.session_id"
+            " WHERE turns_fts MATCH ?"
+        )
+        params = [query]
+        if session_id is not None:
+            sql += " AND turns.session_id = ?"
+            params.append(session_id)
+        if session_ids is not None:
+            sql += f" AND turns.session_id IN ({', '.join('?' * len(session_ids))})"
+            params.extend(session_ids)
+        sql += " ORDER BY bm25(turns_fts) LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [
+            {"id": id_, "session_id": sid, "title": title, "created": created, "snippet": snippet}
+            for id_, sid, title, created, snippet in rows
+        ]
+
+    def append_many(self, turns):
+        """Bulk-insert turn dicts (session_id, user, assistant, created) in one transaction"""
+        rows = [(t["session_id"], t["user"], t["assistant"], t.get("created") or time.time()) for t in turns]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO sessions (id, title, created, updated) VALUES (?, substr(?, 1, 80), ?, ?)"
+                " ON CONFLICT (id) DO UPDATE SET updated = max(sessions.updated, excluded.updated)",
+                [(sid, user, created, created) for sid, user, _, created in rows],
+            )
+            self._conn.executemany(
+                "INSERT INTO turns (session_id, user, assistant, created) VALUES (?, ?, ?, ?)", rows
+            )
+            self._conn.commit()
+        return len(rows)
+
+    def record_artifact(self, session_id, record):
+        """Store one call record from DataScienceExpertAgent.recorder"""
+        return self.record_artifacts([dict(record, session_id=session_id)])
+
+    def record_artifacts(self, records):
+        """Bulk-insert call records in one transaction"""
+        rows = [tuple(record.get(column) for column in ARTIFACT_COLUMNS) for record in records]
+        with self._lock:
+            self._conn.executemany(
+                f"INSERT INTO artifacts ({', '.join(ARTIFACT_COLUMNS)})"
+                f" VALUES ({', '.join('?' * len(ARTIFACT_COLUMNS))})",
+                rows,
+            )
+            self._conn.commit()
+        return len(rows)
+
+    def iter_turns(self, since=None, page=1000, session_id=None):
+        """Yield every turn (or one conversation's) as a dict, oldest first, reading `page` rows at a time"""
+        yield from self._iter_rows(
+            "SELECT id, session_id, user, assistant, created FROM turns",
+            ("id", "session_id", "user", "assistant", "created"), since, page, session_id,
+        )
+
+    def iter_artifacts(self, since=None, page=1000):
+        """Yield every call record as a dict, oldest first, reading `page` rows at a time"""
+        yield from self._iter_rows(
+            f"SELECT id, {', '.join(ARTIFACT_COLUMNS)} FROM artifacts",
+            ("id",) + ARTIFACT_COLUMNS, since, page,
+        )
+
+    def _iter_rows(self, select, columns, since, page, session_id=None):
+        """Keyset-paginate a table by id so only one page is in memory and the lock is held briefly"""
+        last_id = 0
+        while True:
+            query = select + " WHERE id > ?"
+            params = [last_id]
+            if since is not None:
+                query += " AND created >= ?"
+                params.append(since)
+            if session_id is not None:
+                query += " AND session_id = ?"
+                params.append(session_id)
+            query += " ORDER BY id LIMIT ?"
+            params.append(page)
+            with self._lock:
+                rows = self._conn.execute(query, params).fetchall()
+            for row in rows:
+                yield dict(zip(columns, row))
+            if len(rows) < page:
+                return
+            last_id = rows[-1][0]
+
+    def save_state(self, session_id, state):
+        """Store a JSON-serializable snapshot of a conversation's in-memory state"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO session_state (session_id, state, saved) VALUES (?, ?, ?)",
+                (session_id, json.dumps(state), time.time()),
+            )
+            self._conn.commit()
+
+    def load_state(self, session_id):
+        """Return the snapshot saved by save_state(), or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT state FROM session_state WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def delete_session(self, session_id):
+        """Delete a conversation and its turns"""
+        with self._lock:
+            self._conn.execute("DELETE FROM session_state WHERE session_id = ?", (session_id,))
+            self._conn.execute("DELETE FROM artifacts WHERE session_id = ?", (session_id,))
+            self._conn.execute("DELETE FROM turns WHERE session_id = ?", (session_id,))
+            self._conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            self._conn.commit()
+
+    def stats(self):
+        """Return the number of stored conversations and turns"""
+        with self._lock:
+            sessions = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+            turns = self._conn.execute("SELECT COUNT(*) FROM turns").fetchone()[0]
+            artifacts = self._conn.execute("SELECT COUNT(*) FROM artifacts").fetchone()[0]
+        return {"sessions": sessions, "turns": turns, "artifacts": artifacts}
+
+    def close(self):
+        """Close the underlying database connection"""
+        with self._lock:
+            self._conn.close()
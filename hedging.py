@@ -0,0 +1,171 @@
+import threading
+import time
+from collections import deque
+
+
+class _Attempt:
+    """One upstream stream drained by a background thread"""
+
+    def __init__(self, make_stream, cond):
+        """Start draining make_stream() immediately"""
+        self.cond = cond
+        self.chunks = []
+        self.error = None
+        self.started = time.monotonic()
+        self.first_at = None
+        self.done = False
+        self.cancelled = False
+        threading.Thread(target=self._run, args=(make_stream,), daemon=True).start()
+
+    def _run(self, make_stream):
+        """Collect chunks until the stream ends, fails or the attempt is cancelled"""
+        stream = None
+        try:
+            stream = make_stream()
+            for chunk in stream:
+                if self.cancelled:
+                    break
+                with self.cond:
+                    if self.first_at is None:
+                        self.first_at = time.monotonic()
+                    self.chunks.append(chunk)
+                    self.cond.notify_all()
+        except BaseException as e:
+            self.error = e
+        finally:
+            if self.cancelled and hasattr(stream, 'close'):
+                # Closing the generator closes the underlying HTTP response
+                stream.close()
+            with self.cond:
+                self.done = True
+                self.cond.notify_all()
+
+    @property
+    def succeeded(self):
+        """True once the stream has ended without an error"""
+        return self.done and self.error is None
+
+    def cancel(self):
+        """Ask the drain thread to stop and drop the connection"""
+        self.cancelled = True
+
+
+class Hedger:
+    """Send a duplicate request when the first is slower than recent calls
+
+    The hedge fires once the primary request has gone longer than the given
+    percentile of recent first-chunk latencies without producing a chunk;
+    whichever attempt wins is kept and the other is cancelled. `budget` caps
+    hedges as a fraction of all requests.
+    """
+
+    def __init__(self, percentile=95, budget=0.05, min_samples=20, window=200, min_delay=0.25):
+        """Configure the trigger percentile and the extra-traffic budget"""
+        self.percentile = percentile
+        self.budget = budget
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+
+        self.samples = deque(maxlen=window)
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._lock = threading.Lock()
+
+    def hedge_delay(self):
+        """Seconds to wait for a first chunk before hedging, or None while still learning"""
+        with self._lock:
+            if len(self.samples) < self.min_samples:
+                return None
+            ordered = sorted(self.samples)
+        index = min(int(len(ordered) * self.percentile / 100), len(ordered) - 1)
+        return max(ordered[index], self.min_delay)
+
+    def _take_budget(self):
+        """Reserve a hedge if it keeps extra traffic within the budget"""
+        with self._lock:
+            if self.hedges + 1 > self.budget * self.requests:
+                return False
+            self.hedges += 1
+            return True
+
+    def _record(self, attempt):
+        """Add an attempt's first-chunk latency to the sample window"""
+        if attempt.first_at is not None:
+            with self._lock:
+                self.samples.append(attempt.first_at - attempt.started)
+
+    def run(self, make_stream, until_done=False):
+        """Yield chunks from the winning attempt of make_stream()
+
+        With until_done=False the first attempt to produce a chunk wins, which
+        suits streaming to a user; with until_done=True the first attempt to
+        finish wins.
+        """
+        with self._lock:
+            self.requests += 1
+
+        cond = threading.Condition()
+        primary = _Attempt(make_stream, cond)
+        attempts = [primary]
+
+        delay = self.hedge_delay()
+        if delay is not None:
+            with cond:
+                cond.wait_for(lambda: primary.first_at is not None or primary.done, timeout=delay)
+                slow = primary.first_at is None and not primary.done
+            if slow and self._take_budget():
+                attempts.append(_Attempt(make_stream, cond))
+
+        def winner():
+            for attempt in attempts:
+                if attempt.succeeded or (not until_done and attempt.first_at is not None):
+                    return attempt
+            return None
+
+        with cond:
+            cond.wait_for(lambda: winner() is not None or all(a.done for a in attempts))
+            chosen = winner()
+
+        for attempt in attempts:
+            self._record(attempt)
+            if attempt is not chosen:
+                attempt.cancel()
+
+        if chosen is None:
+            # Every attempt failed; surface the primary's error
+            raise primary.error
+        if chosen is not primary:
+            with self._lock:
+                self.hedge_wins += 1
+
+        # Replay the winner's chunks, following it until it finishes
+        index = 0
+        try:
+            while True:
+                with cond:
+                    cond.wait_for(lambda: chosen.done or len(chosen.chunks) > index)
+                    chunks = chosen.chunks[index:]
+                    done = chosen.done
+                yield from chunks
+                index += len(chunks)
+                if done and index >= len(chosen.chunks):
+                    break
+        except GeneratorExit:
+            # The reader stopped early, so stop draining the winner too
+            chosen.cancel()
+            raise
+        if chosen.error is not None:
+            raise chosen.error
+
+    def stats(self):
+        """Return hedge counters and the current trigger delay"""
+        with self._lock:
+            requests, hedges, wins = self.requests, self.hedges, self.hedge_wins
+        return {
+            'requests': requests,
+            'hedges': hedges,
+            'hedge_wins': wins,
+            'hedge_rate': hedges / requests if requests else 0.0,
+            'hedge_delay': self.hedge_delay(),
+        }
@@ -0,0 +1,144 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Job:
+    """One background request; streamed output accumulates in `chunks` as it arrives"""
+
+    def __init__(self, key=None):
+        """Create a pending job"""
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.status = "running"
+        self.chunks = []
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+
+    @property
+    def done(self):
+        """True once the job has succeeded, failed or been cancelled"""
+        return self.status != "running"
+
+    @property
+    def text(self):
+        """Output so far (all of it once the job is done)"""
+        return "".join(self.chunks)
+
+
+class JobManager:
+    """Shared worker pool running long requests as jobs that outlive reruns
+
+    A job is looked up by id, so a page can submit it once and poll it from
+    any later rerun. Submitting with the `key` of a job that is still
+    running returns that job instead of starting a duplicate. Finished jobs
+    are kept for `ttl` seconds, up to `max_jobs`. A cancelled job's stream
+    is closed at its next chunk, which drops the upstream request.
+    """
+
+    def __init__(self, max_workers=16, max_jobs=1000, ttl=60 * 60):
+        """Start a pool of `max_workers` threads"""
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+        self.submitted = 0
+        self.deduplicated = 0
+        self.cancelled = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs = OrderedDict()
+        self._running = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn, key=None):
+        """Run fn() in the pool and return its Job
+
+        fn may return a string or an iterable of text chunks (a *_stream
+        method); chunks are exposed on the job as they arrive.
+        """
+        with self._lock:
+            if key is not None and key in self._running:
+                self.deduplicated += 1
+                return self._running[key]
+            job = Job(key)
+            self._jobs[job.id] = job
+            if key is not None:
+                self._running[key] = job
+            self.submitted += 1
+            self._prune()
+        self._executor.submit(self._run, job, fn)
+        return job
+
+    def _run(self, job, fn):
+        """Drain fn() into the job and record how it ended"""
+        status, error = "done", None
+        try:
+            result = fn()
+            if isinstance(result, str):
+                job.chunks.append(result)
+            else:
+                for chunk in result:
+                    if job.status == "cancelled":
+                        if hasattr(result, 'close'):
+                            result.close()
+                        break
+                    job.chunks.append(chunk)
+        except Exception as e:
+            status, error = "failed", e
+        finally:
+            with self._lock:
+                if job.status == "running":
+                    job.error = error
+                    job.status = status
+                    job.finished = time.time()
+                if job.key is not None and self._running.get(job.key) is job:
+                    del self._running[job.key]
+
+    def cancel(self, job_id):
+        """Cancel a running job; returns False if it is unknown or already finished
+
+        The job reads as cancelled at once and a new submit with its key
+        starts afresh; the worker stops at the stream's next chunk.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.done:
+                return False
+            job.status = "cancelled"
+            job.finished = time.time()
+            if job.key is not None and self._running.get(job.key) is job:
+                del self._running[job.key]
+            self.cancelled += 1
+            return True
+
+    def _prune(self):
+        """Forget expired finished jobs, then the oldest finished ones beyond max_jobs
+
+        Running jobs are skipped, so a long or hung one doesn't hold back
+        expiry of the jobs behind it.
+        """
+        cutoff = time.time() - self.ttl
+        for job_id, job in list(self._jobs.items()):
+            if not job.done:
+                continue
+            if len(self._jobs) <= self.max_jobs and job.finished >= cutoff:
+                continue
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        """Return the job with this id, or None if it is unknown or expired"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self):
+        """Return job counts"""
+        with self._lock:
+            running = sum(not job.done for job in self._jobs.values())
+            return {
+                "running": running,
+                "finished": len(self._jobs) - running,
+                "submitted": self.submitted,
+                "deduplicated": self.deduplicated,
+                "cancelled": self.cancelled,
+            }
@@ -0,0 +1,92 @@
+import argparse
+import gzip
+import itertools
+import json
+import os
+from conversation_store import ConversationStore
+
+# Record types written to and read from export files
+RECORD_TYPES = ("turn", "artifact")
+
+
+def _open(path, mode):
+    """Open a JSONL file for text I/O, gzip-compressed if the name ends in .gz"""
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def export_jsonl(store, path, types=RECORD_TYPES, since=None):
+    """Stream conversations and call records from `store` to a JSONL file
+
+    Each line is one record tagged with its "type". Rows are read a page at
+    a time and written as they arrive, so memory stays flat however large
+    the export. Returns the number of records written.
+    """
+    sources = {"turn": store.iter_turns, "artifact": store.iter_artifacts}
+    count = 0
+    with _open(path, "w") as f:
+        for record_type in types:
+            for row in sources[record_type](since=since):
+                row.pop("id", None)
+                row["type"] = record_type
+                f.write(json.dumps(row, ensure_ascii=False))
+                f.write("\n")
+                count += 1
+    return count
+
+
+def iter_jsonl(path):
+    """Yield records from a JSONL file one line at a time, skipping blank lines"""
+    with _open(path, "r") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{number}: invalid JSON ({e.msg})") from None
+
+
+def import_jsonl(store, path, batch_size=500):
+    """Load a JSONL export into `store` in batches; returns counts per record type"""
+    counts = dict.fromkeys(RECORD_TYPES, 0)
+    writers = {"turn": store.append_many, "artifact": store.record_artifacts}
+    records = iter_jsonl(path)
+    while True:
+        batch = list(itertools.islice(records, batch_size))
+        if not batch:
+            return counts
+        for record_type in RECORD_TYPES:
+            rows = [record for record in batch if record.get("type") == record_type]
+            if rows:
+                counts[record_type] += writers[record_type](rows)
+
+
+def main():
+    """Export or import the conversation database from the command line"""
+    parser = argparse.ArgumentParser(description="Stream conversations and call records to or from JSONL")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("path", help="JSONL file (.jsonl or .jsonl.gz)")
+    parser.add_argument(
+        "--db", default=os.getenv("CONVERSATION_DB_PATH", "conversations.sqlite3"),
+        help="conversation database",
+    )
+    parser.add_argument("--since", type=float, help="export only records created at or after this Unix time")
+    parser.add_argument("--types", nargs="+", choices=RECORD_TYPES, default=list(RECORD_TYPES))
+    args = parser.parse_args()
+
+    store = ConversationStore(args.db)
+    try:
+        if args.command == "export":
+            count = export_jsonl(store, args.path, args.types, args.since)
+            print(f"Exported {count:,} records to {args.path}")
+        else:
+            counts = import_jsonl(store, args.path)
+            print(f"Imported {counts['turn']:,} turns and {counts['artifact']:,} call records")
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
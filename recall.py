@@ -0,0 +1,199 @@
+import sys
+import threading
+import weakref
+import numpy as np
+from semantic_cache import HashingEmbedder
+from turn_history import as_turn
+
+# Every live index in the process, for index_report()
+_indexes = weakref.WeakSet()
+_indexes_lock = threading.Lock()
+
+
+class TurnIndex:
+    """Per-session vector index over past chat turns for recalling relevant context
+
+    Every turn is embedded once as it is added. A search scores the new
+    message against all turns except the newest ones (still in the chat
+    window), so the cost of recall depends on k, not on how long the session
+    has run. With `load` set (a callable mapping turn ids to turn dicts, such
+    as ConversationStore.turns_by_id), only ids and vectors are kept and the
+    text of the k recalled turns is fetched per search; without it the index
+    keeps the Turn records themselves. With `save` set as well (a callable
+    taking (turn id, vector bytes) pairs, such as a partial of
+    ConversationStore.save_vectors), each vector is stored once its turn has
+    an id, so a restore reads vectors back instead of re-embedding.
+    """
+
+    def __init__(self, embedder=None, k=4, min_similarity=0.25, max_chars=1500, load=None,
+                 save=None):
+        """Create an empty index returning up to `k` turns above `min_similarity`"""
+        self.embedder = embedder if embedder is not None else HashingEmbedder()
+        self.k = k
+        self.min_similarity = min_similarity
+        self.max_chars = max_chars
+        self.load = load
+        self.save = save
+        self.recalls = 0
+        # Stored vectors are only reused by an embedder with the same key
+        self.embedder_key = "/".join([
+            type(self.embedder).__name__, getattr(self.embedder, "model", ""), str(self.embedder.dim)
+        ])
+
+        # Rows beyond the entry count are preallocated room to grow
+        self._vectors = np.zeros((0, self.embedder.dim), dtype=np.float32)
+        # A stored turn's id, or its Turn until it has an id and `load` is set
+        self._entries = []
+        self._pending = []
+        self._lock = threading.Lock()
+        with _indexes_lock:
+            _indexes.add(self)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, turn):
+        """Embed and store one turn (a Turn or turn dict)"""
+        self.extend([turn])
+
+    def extend(self, turns, batch=100):
+        """Embed and store turns, oldest first, `batch` at a time
+
+        `turns` may be a generator such as ConversationStore.iter_turn_vectors(),
+        so a whole conversation is indexed without holding its text at once.
+        Turn dicts carrying a stored "vector" (and an "id") are not re-embedded.
+        """
+        chunk = []
+        for turn in turns:
+            chunk.append(turn)
+            if len(chunk) >= batch:
+                self._append(chunk)
+                chunk = []
+        if chunk:
+            self._append(chunk)
+
+    def _append(self, turns):
+        stored = [turn.get("vector") if isinstance(turn, dict) else None for turn in turns]
+        missing = [i for i, vector in enumerate(stored) if vector is None]
+        vectors = np.zeros((len(turns), self.embedder.dim), dtype=np.float32)
+        for i, vector in enumerate(stored):
+            if vector is not None:
+                vectors[i] = np.frombuffer(vector, dtype=np.float32)
+        if missing:
+            texts = [as_turn(turns[i]) for i in missing]
+            # The question carries most of the meaning; the reply's opening adds the topic
+            vectors[missing] = self.embedder.embed([
+                turn.user + "\n" + turn.assistant[:self.max_chars] for turn in texts
+            ])
+            turns = list(turns)
+            for i, turn in zip(missing, texts):
+                turns[i] = turn
+
+        with self._lock:
+            unsaved = self._settle()
+            count = len(self._entries)
+            if count + len(turns) > len(self._vectors):
+                rows = max(count * 2, count + len(turns), 16)
+                grown = np.zeros((rows, self.embedder.dim), dtype=np.float32)
+                grown[:count] = self._vectors[:count]
+                self._vectors = grown
+            self._vectors[count:count + len(turns)] = vectors
+            for i, turn in enumerate(turns):
+                turn_id = turn.get("id") if isinstance(turn, dict) else turn.id
+                if self.load is not None and turn_id is not None:
+                    self._entries.append(turn_id)
+                    if stored[i] is None:
+                        unsaved.append((turn_id, vectors[i].tobytes()))
+                else:
+                    self._pending.append(len(self._entries))
+                    self._entries.append(as_turn(turn))
+        self._save(unsaved)
+
+    def _save(self, vectors):
+        """Pass newly stored turns' (id, vector bytes) pairs to `save`, if set"""
+        if vectors and self.save is not None:
+            self.save(vectors)
+
+    def _settle(self):
+        """Swap held Turns for their ids once they have been stored; the lock must be held
+
+        Returns (turn id, vector bytes) pairs for the turns swapped, to be saved.
+        """
+        if self.load is None or not self._pending:
+            return []
+        pending = []
+        settled = []
+        for index in self._pending:
+            turn_id = self._entries[index].id
+            if turn_id is None:
+                pending.append(index)
+            else:
+                self._entries[index] = turn_id
+                settled.append((turn_id, self._vectors[index].tobytes()))
+        self._pending = pending
+        return settled
+
+    def search(self, text, exclude_last=0):
+        """Return up to k stored turns most similar to `text`, oldest first
+
+        The newest `exclude_last` turns are skipped; they are already in the
+        conversation window.
+        """
+        with self._lock:
+            candidates = len(self._entries) - exclude_last
+        if self.k <= 0 or candidates <= 0:
+            return []
+        vector = self.embedder.embed([text])[0]
+        with self._lock:
+            unsaved = self._settle()
+            scores = self._vectors[:candidates] @ vector
+            k = min(self.k, candidates)
+            best = np.argpartition(-scores, k - 1)[:k]
+            picked = [self._entries[int(i)] for i in sorted(best) if scores[i] >= self.min_similarity]
+        self._save(unsaved)
+        ids = [entry for entry in picked if isinstance(entry, int)]
+        loaded = {turn["id"]: turn for turn in self.load(ids)} if ids else {}
+        # A turn deleted from the store since it was indexed is skipped
+        turns = [loaded.get(entry) if isinstance(entry, int) else entry for entry in picked]
+        turns = [turn for turn in turns if turn is not None]
+        if turns:
+            self.recalls += 1
+        return turns
+
+    def nbytes(self):
+        """Approximate resident size of the vectors, ids and any Turns still held"""
+        with self._lock:
+            held = [self._entries[index] for index in self._pending]
+            return self._vectors.nbytes + sys.getsizeof(self._entries) + sum(turn.nbytes() for turn in held)
+
+    def clear(self):
+        """Forget every turn"""
+        with self._lock:
+            self._vectors = np.zeros((0, self.embedder.dim), dtype=np.float32)
+            self._entries = []
+            self._pending = []
+
+
+def index_report():
+    """Totals over every live recall index in the process"""
+    with _indexes_lock:
+        indexes = list(_indexes)
+    return {
+        "indexes": len(indexes),
+        "turns": sum(len(index) for index in indexes),
+        "bytes": sum(index.nbytes() for index in indexes),
+    }
+
+
+def with_recalled(message, turns, max_chars=1500):
+    """Prefix `message` with recalled turns, or return it unchanged if there are none"""
+    if not turns:
+        return message
+    parts = ["Relevant earlier parts of our conversation:"]
+    for turn in turns:
+        assistant = turn["assistant"]
+        if len(assistant) > max_chars:
+            assistant = assistant[:max_chars] + " …"
+        parts.append(f"User: {turn['user']}\nAssistant: {assistant}")
+    parts.append("---\n\n" + message)
+    return "\n\n".join(parts)
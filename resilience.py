@@ -0,0 +1,246 @@
+import os
+import random
+import threading
+import time
+
+# HTTP status codes worth retrying: rate limiting and transient upstream failures
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling upstream while the circuit breaker is open"""
+
+    def __init__(self, retry_in):
+        """Record how long until the breaker lets a probe through"""
+        super().__init__(f"Gemini API is degraded; retry in {retry_in:.0f}s")
+        self.retry_in = retry_in
+
+
+def is_retryable(error):
+    """Return True for rate-limit, server-side and transport errors"""
+    import httpx
+    from google.genai import errors
+
+    if isinstance(error, errors.APIError):
+        return error.code in RETRYABLE_STATUS_CODES
+    return isinstance(error, (httpx.TransportError, TimeoutError))
+
+
+def _parse_seconds(value):
+    """Parse '12s', '1.5s' or '12' into seconds, or return None"""
+    try:
+        return float(str(value).strip().rstrip('s'))
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_hint(error):
+    """Return the server's suggested retry delay in seconds, if it sent one"""
+    # google.rpc.RetryInfo in the error payload
+    details = getattr(error, 'details', None)
+    if isinstance(details, dict):
+        payload = details.get('error', details)
+        for detail in payload.get('details', []) or []:
+            if isinstance(detail, dict) and 'retryDelay' in detail:
+                seconds = _parse_seconds(detail['retryDelay'])
+                if seconds is not None:
+                    return seconds
+
+    # Retry-After response header
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if headers is not None:
+        return _parse_seconds(headers.get('retry-after'))
+    return None
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter that honors server retry hints"""
+
+    def __init__(self, max_attempts=5, base_delay=1.0, max_delay=60.0):
+        """Configure attempts and delay bounds in seconds"""
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt, error):
+        """Seconds to wait before retry number `attempt` (starting at 1)"""
+        hint = retry_hint(error)
+        if hint is not None:
+            # Never retry before the server asked us to, but spread clients out
+            return min(hint + random.uniform(0, self.base_delay), self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at `per_minute` tokens per minute"""
+
+    def __init__(self, per_minute, capacity=None):
+        """Start full; capacity defaults to one minute of tokens"""
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount=1):
+        """Take `amount` tokens and return how many seconds the caller must wait"""
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            # A negative balance is debt that later callers queue behind
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+
+class RateLimiter:
+    """Client-side limiter sized to the requests-per-minute and tokens-per-minute quota"""
+
+    def __init__(self, rpm=None, tpm=None):
+        """Create a bucket for each quota that is set"""
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+
+    def reserve(self, tokens=0):
+        """Reserve one request and `tokens` tokens, returning the wait in seconds"""
+        wait = 0.0
+        if self.requests is not None:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens is not None and tokens:
+            wait = max(wait, self.tokens.reserve(tokens))
+        return wait
+
+
+class CircuitBreaker:
+    """Fail fast after repeated upstream failures, probing again after a cool-down"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        """Open after `failure_threshold` consecutive failures for `reset_timeout` seconds"""
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpenError if calls should not go upstream right now"""
+        with self._lock:
+            if self.state == 'closed':
+                return
+            elapsed = time.monotonic() - self.opened_at
+            if elapsed >= self.reset_timeout:
+                # Let a single probe through; another one follows if it never reports back
+                self.state = 'half_open'
+                self.opened_at = time.monotonic()
+                return
+            raise CircuitOpenError(max(self.reset_timeout - elapsed, 0.0))
+
+    def record_success(self):
+        """Close the breaker after a call reached a healthy upstream"""
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+
+    def record_failure(self):
+        """Count a degraded-upstream failure, opening the breaker when needed"""
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+
+class Resilience:
+    """Rate limiting, retries and circuit breaking around an upstream call"""
+
+    def __init__(self, retry=None, limiter=None, breaker=None):
+        """Combine the given policies; retries and breaking are on by default"""
+        self.retry = retry if retry is not None else RetryPolicy()
+        self.limiter = limiter
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.retries = 0
+        self.throttled_seconds = 0.0
+
+    def _throttle(self, tokens):
+        """Return the limiter wait for one call"""
+        if self.limiter is None:
+            return 0.0
+        wait = self.limiter.reserve(tokens)
+        self.throttled_seconds += wait
+        return wait
+
+    def call(self, fn, tokens=0):
+        """Call fn() with limiting, retries and circuit breaking"""
+        attempt = 0
+        while True:
+            attempt += 1
+            self.breaker.before_call()
+            time.sleep(self._throttle(tokens))
+            try:
+                result = fn()
+            except Exception as e:
+                if not is_retryable(e):
+                    from google.genai import errors
+                    if isinstance(e, errors.APIError):
+                        # The upstream answered, it just rejected this request
+                        self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                if attempt >= self.retry.max_attempts:
+                    raise
+                self.retries += 1
+                time.sleep(self.retry.delay(attempt, e))
+                continue
+            self.breaker.record_success()
+            return result
+
+    async def acall(self, fn, tokens=0):
+        """Async variant of call() for coroutine functions"""
+        import asyncio
+
+        attempt = 0
+        while True:
+            attempt += 1
+            self.breaker.before_call()
+            await asyncio.sleep(self._throttle(tokens))
+            try:
+                result = await fn()
+            except Exception as e:
+                if not is_retryable(e):
+                    from google.genai import errors
+                    if isinstance(e, errors.APIError):
+                        # The upstream answered, it just rejected this request
+                        self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                if attempt >= self.retry.max_attempts:
+                    raise
+                self.retries += 1
+                await asyncio.sleep(self.retry.delay(attempt, e))
+                continue
+            self.breaker.record_success()
+            return result
+
+    def stats(self):
+        """Return retry, throttling and breaker counters"""
+        return {
+            'retries': self.retries,
+            'throttled_seconds': self.throttled_seconds,
+            'circuit': self.breaker.state,
+            'consecutive_failures': self.breaker.failures,
+        }
+
+
+def resilience_from_env():
+    """Resilience sized to the GEMINI_RPM / GEMINI_TPM quota
+
+    The limiter only enforces the quota if every caller in the process
+    shares the same instance, so build this once and pass it to each agent.
+    """
+    rpm = int(os.getenv('GEMINI_RPM', '0'))
+    tpm = int(os.getenv('GEMINI_TPM', '0'))
+    limiter = RateLimiter(rpm, tpm) if rpm or tpm else None
+    return Resilience(limiter=limiter)
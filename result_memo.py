@@ -0,0 +1,85 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+
+class ResultMemo:
+    """Size-bounded LRU of finished page results keyed on the page's inputs"""
+
+    def __init__(self, max_entries=50, max_bytes=5 * 1024 * 1024):
+        """Create an empty memo holding at most `max_entries` results and `max_bytes` of text"""
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(page, inputs):
+        """Stable key for a page and its inputs; large inputs such as code aren't kept"""
+        payload = json.dumps([page, inputs], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, page, inputs):
+        """Return the memoized result, or None"""
+        key = self.make_key(page, inputs)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, page, inputs, result):
+        """Memoize a result, evicting least recently used ones beyond the bounds"""
+        key = self.make_key(page, inputs)
+        size = len(result.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._entries[key] = (page, result, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, page, inputs=None):
+        """Forget the result for these inputs, or every result for `page` if inputs is None"""
+        with self._lock:
+            if inputs is not None:
+                keys = [self.make_key(page, inputs)]
+            else:
+                keys = [key for key, entry in self._entries.items() if entry[0] == page]
+            for key in keys:
+                entry = self._entries.pop(key, None)
+                if entry is not None:
+                    self._bytes -= entry[2]
+
+    def clear(self):
+        """Forget every result"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Return hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
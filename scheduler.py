@@ -0,0 +1,246 @@
+import contextlib
+import threading
+import time
+from collections import OrderedDict, deque
+
+# Scheduling classes, highest first: chat replies someone is waiting on, single
+# requests from the other pages, then batch work
+PRIORITIES = ("interactive", "standard", "bulk")
+
+
+class BusyError(RuntimeError):
+    """Raised without queuing when the scheduler is over capacity"""
+
+    def __init__(self, queued):
+        """Record how many calls were waiting"""
+        super().__init__(f"The service is busy ({queued} requests waiting); please try again shortly")
+        self.queued = queued
+
+
+class _Waiter:
+    """One queued call; grant() hands it a slot and wakes its caller"""
+
+    __slots__ = ("key", "cost", "priority", "enqueued", "granted", "wake")
+
+    def __init__(self, key, cost, priority, wake):
+        self.key = key
+        self.cost = cost
+        self.priority = priority
+        self.enqueued = time.monotonic()
+        self.granted = False
+        self.wake = wake
+
+    def grant(self):
+        """Mark the slot as taken by this call and wake it"""
+        self.granted = True
+        self.wake()
+
+
+def _resolve(future):
+    """Complete an asyncio future unless it was already cancelled"""
+    if not future.done():
+        future.set_result(None)
+
+
+class FairScheduler:
+    """Admission control and fair queuing for upstream calls from every session
+
+    At most `max_concurrent` calls run at once and the rest wait in a queue.
+    Queued calls are served highest priority class first; within a class,
+    sessions take turns by deficit round robin, each earning `quantum`
+    estimated tokens of credit per round, so one session's burst of large
+    requests can't starve the others. The last `reserved` slots only go to
+    interactive calls. Beyond `max_queue` waiting calls, or after waiting
+    `max_wait` seconds, BusyError is raised instead.
+    """
+
+    def __init__(self, max_concurrent=8, max_queue=64, quantum=4000, max_wait=30.0,
+                 reserved=0, window=500):
+        """Configure slots, queue bound, round-robin quantum and wait-time sample window"""
+        if max_concurrent < 1 or not 0 <= reserved < max_concurrent:
+            raise ValueError("need max_concurrent >= 1 and 0 <= reserved < max_concurrent")
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.quantum = quantum
+        self.max_wait = max_wait
+        self.reserved = reserved
+
+        self.running = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.waits = deque(maxlen=window)
+
+        # Per class: session key -> its queued calls in arrival order, and its credit
+        self._flows = {priority: OrderedDict() for priority in PRIORITIES}
+        self._deficits = {priority: {} for priority in PRIORITIES}
+        self._queued = 0
+        self._lock = threading.Lock()
+
+    def _limit(self, priority):
+        """Slots a call of this class may fill"""
+        return self.max_concurrent if priority == PRIORITIES[0] else self.max_concurrent - self.reserved
+
+    def _enqueue(self, key, cost, priority, wake):
+        """Queue a call and dispatch; raises BusyError if it can't run and the queue is full"""
+        if priority not in PRIORITIES:
+            raise ValueError(f"priority must be one of {', '.join(PRIORITIES)}")
+        waiter = _Waiter(key, cost, priority, wake)
+        with self._lock:
+            self._flows[priority].setdefault(key, deque()).append(waiter)
+            self._queued += 1
+            self._dispatch()
+            if not waiter.granted and self._queued > self.max_queue:
+                # Report the depth this call found, not what is left once it is removed
+                queued = self._queued
+                self._remove(waiter)
+                self.rejected += 1
+                raise BusyError(queued)
+        return waiter
+
+    def _dispatch(self):
+        """Grant free slots to queued calls; the lock must be held"""
+        for priority in PRIORITIES:
+            flows = self._flows[priority]
+            while flows and self.running < self._limit(priority):
+                waiter = self._next(priority)
+                self._queued -= 1
+                self.running += 1
+                self.admitted += 1
+                self.waits.append(time.monotonic() - waiter.enqueued)
+                waiter.grant()
+            if flows:
+                # Lower classes wait while a higher one still has calls queued
+                return
+
+    def _next(self, priority):
+        """Pop the next call of a class by deficit round robin over its sessions"""
+        flows = self._flows[priority]
+        deficits = self._deficits[priority]
+        while True:
+            key, waiters = next(iter(flows.items()))
+            credit = deficits.get(key, 0)
+            if waiters[0].cost <= credit:
+                waiter = waiters.popleft()
+                if waiters:
+                    deficits[key] = credit - waiter.cost
+                else:
+                    # An idle session doesn't bank credit
+                    del flows[key]
+                    deficits.pop(key, None)
+                return waiter
+            # Out of credit: earn a quantum and go to the back of the round
+            deficits[key] = credit + self.quantum
+            flows.move_to_end(key)
+
+    def _remove(self, waiter):
+        """Take a queued call out of its session's queue; the lock must be held"""
+        flows = self._flows[waiter.priority]
+        waiters = flows.get(waiter.key)
+        if waiters is None or waiter not in waiters:
+            return
+        waiters.remove(waiter)
+        self._queued -= 1
+        if not waiters:
+            del flows[waiter.key]
+            self._deficits[waiter.priority].pop(waiter.key, None)
+
+    def _withdraw(self, waiter):
+        """Give up on a queued call; returns False if it was granted a slot meanwhile"""
+        with self._lock:
+            if waiter.granted:
+                return False
+            self._remove(waiter)
+            return True
+
+    def _release(self):
+        """Free a slot and hand it to the next queued call"""
+        with self._lock:
+            self.running -= 1
+            self._dispatch()
+
+    def _time_out(self):
+        """Count a call that waited too long and raise BusyError for it"""
+        with self._lock:
+            self.timeouts += 1
+            queued = self._queued
+        raise BusyError(queued)
+
+    @contextlib.contextmanager
+    def slot(self, key, cost=0, priority="standard"):
+        """Hold a slot for the `with` block, queuing fairly with other sessions' calls
+
+        `key` identifies the session and `cost` is the call's estimated tokens.
+        """
+        event = threading.Event()
+        waiter = self._enqueue(key, cost, priority, event.set)
+        try:
+            granted = waiter.granted or event.wait(self.max_wait)
+        except BaseException:
+            # Interrupted while queued (e.g. Ctrl-C)
+            if not self._withdraw(waiter):
+                self._release()
+            raise
+        if not granted and self._withdraw(waiter):
+            self._time_out()
+        try:
+            yield
+        finally:
+            self._release()
+
+    @contextlib.asynccontextmanager
+    async def aslot(self, key, cost=0, priority="standard"):
+        """Async variant of slot(); waiting doesn't block the event loop"""
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = self._enqueue(key, cost, priority, lambda: loop.call_soon_threadsafe(_resolve, future))
+        granted = waiter.granted
+        if not granted:
+            try:
+                await asyncio.wait_for(future, self.max_wait)
+                granted = True
+            except asyncio.TimeoutError:
+                pass
+            except BaseException:
+                if not self._withdraw(waiter):
+                    self._release()
+                raise
+        if not granted and self._withdraw(waiter):
+            self._time_out()
+        try:
+            yield
+        finally:
+            self._release()
+
+    def stats(self):
+        """Return queue depth, wait-time percentiles in seconds and admission counters"""
+        with self._lock:
+            waits = sorted(self.waits)
+            depth = {
+                priority: sum(len(waiters) for waiters in self._flows[priority].values())
+                for priority in PRIORITIES
+            }
+            sessions = len({key for flows in self._flows.values() for key in flows})
+            counters = {
+                'running': self.running,
+                'queued': self._queued,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'timeouts': self.timeouts,
+            }
+
+        def percentile(p):
+            if not waits:
+                return 0.0
+            return waits[min(int(len(waits) * p / 100), len(waits) - 1)]
+
+        return {
+            **counters,
+            'queued_by_priority': depth,
+            'sessions_waiting': sessions,
+            'wait_p50': percentile(50),
+            'wait_p95': percentile(95),
+            'wait_max': waits[-1] if waits else 0.0,
+        }
@@ -0,0 +1,281 @@
+import json
+import os
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+import numpy as np
+
+# Words that carry no meaning for matching questions against each other
+STOPWORDS = frozenset("""
+a an and are as at be between by can compare comparison difference differences do does
+explain for from how i in is it me of on or please tell the to vs versus what when which
+why with you your
+""".split())
+
+
+# Words that flip a question's meaning, and qualifiers that must match exactly
+# (numbers, words with digits such as "L1", and Roman numerals as in "Type II
+# error"). Near-duplicates that
+# differ in these ("...use X?" / "...not use X?", "p-value of 0.04" / "0.4")
+# embed close together but need different answers.
+_NEGATION = re.compile(r"\b(?:not|no|never|without|nor|cannot)\b|n't\b")
+_QUALIFIERS = re.compile(r"\b(?:[a-z]*\d+(?:\.\d+)?[a-z]*|i{2,3}|iv|vi{0,3}|ix|xi{0,3})\b")
+
+
+def guard_key(text):
+    """Hash of a question's negation and exact qualifiers; matches require equal keys"""
+    text = text.lower()
+    negated = "neg" if _NEGATION.search(text) else ""
+    qualifiers = sorted(set(_QUALIFIERS.findall(text)))
+    return zlib.crc32("|".join([negated] + qualifiers).encode("utf-8"))
+
+
+def _normalize_word(word):
+    """Fold British spellings and plurals so variants hash to the same features"""
+    word = word.replace("isation", "ization").replace("ise", "ize")
+    if len(word) > 4 and word.endswith("s") and not word.endswith("ss"):
+        word = word[:-1]
+    return word
+
+
+class HashingEmbedder:
+    """Local embedder using hashed word and character 4-gram features"""
+
+    # Cosine similarity above which two questions are treated as the same
+    default_threshold = 0.9
+
+    # Whole-word features count double against the character 4-grams
+    word_weight = 2.0
+
+    def __init__(self, dim=1024):
+        """Create an embedder producing `dim`-dimensional unit vectors"""
+        self.dim = dim
+
+    def embed(self, texts):
+        """Return an (n, dim) float32 array of L2-normalized embeddings"""
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = [
+                _normalize_word(word)
+                for word in re.findall(r"[a-z0-9]+", text.lower())
+                if word not in STOPWORDS
+            ]
+            for word in words:
+                padded = f"<{word}>"
+                features = [("w:" + word, self.word_weight)]
+                features += [(padded[i:i + 4], 1.0) for i in range(len(padded) - 3)]
+                for feature, weight in features:
+                    # crc32 is stable across processes, unlike hash()
+                    h = zlib.crc32(feature.encode("utf-8"))
+                    vectors[row, h % self.dim] += weight if h & 0x80000000 else -weight
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-9)
+
+
+class GeminiEmbedder:
+    """Embedder backed by batched Gemini embed_content calls"""
+
+    default_threshold = 0.92
+
+    def __init__(self, client, model="gemini-embedding-001", dim=768, batch_size=100):
+        """Embed through `client` with the given model and output size"""
+        self.client = client
+        self.model = model
+        self.dim = dim
+        self.batch_size = batch_size
+
+    def embed(self, texts):
+        """Return an (n, dim) float32 array of L2-normalized embeddings"""
+        from google.genai import types
+
+        rows = []
+        for start in range(0, len(texts), self.batch_size):
+            result = self.client.models.embed_content(
+                model=self.model,
+                contents=list(texts[start:start + self.batch_size]),
+                config=types.EmbedContentConfig(
+                    task_type="SEMANTIC_SIMILARITY",
+                    output_dimensionality=self.dim,
+                ),
+            )
+            rows.extend(embedding.values for embedding in result.embeddings)
+        vectors = np.asarray(rows, dtype=np.float32).reshape(len(texts), self.dim)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-9)
+
+
+class SemanticCache:
+    """Near-duplicate question cache over a vectorized cosine-similarity index
+
+    A stored answer is only reused for a question with the same guard_key(),
+    however similar the embeddings.
+    """
+
+    def __init__(self, embedder=None, threshold=None, max_entries=5000, path=None,
+                 autosave_every=20):
+        """Create the index, loading it from `path` if one was saved before"""
+        self.embedder = embedder if embedder is not None else HashingEmbedder()
+        self.threshold = threshold if threshold is not None else self.embedder.default_threshold
+        self.max_entries = max_entries
+        self.path = path
+        self.autosave_every = autosave_every
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.last_similarity = None
+
+        # Parallel arrays: one row per stored question, in the first
+        # len(_entries) rows; the rest is preallocated room to grow
+        self._allocate(0)
+        self._entries = []
+        self._unsaved = 0
+        self._embedded = OrderedDict()
+        self._lock = threading.Lock()
+
+        if path and os.path.exists(path):
+            self.load()
+
+    def _allocate(self, rows):
+        """Replace the arrays with empty ones of `rows` rows; the lock must be held"""
+        self._vectors = np.zeros((rows, self.embedder.dim), dtype=np.float32)
+        self._last_used = np.zeros(rows, dtype=np.float64)
+        self._namespaces = np.zeros(rows, dtype="<U64")
+        self._guards = np.zeros(rows, dtype=np.int64)
+
+    def _grow(self):
+        """Double the preallocated rows, up to max_entries; the lock must be held"""
+        count = len(self._entries)
+        old = (self._vectors, self._last_used, self._namespaces, self._guards)
+        self._allocate(min(max(count * 2, 16), self.max_entries))
+        for new, current in zip((self._vectors, self._last_used, self._namespaces, self._guards), old):
+            new[:count] = current[:count]
+
+    def _embed(self, text):
+        """Embed one text, memoizing recent ones so lookup and put share the work"""
+        with self._lock:
+            vector = self._embedded.get(text)
+            if vector is not None:
+                self._embedded.move_to_end(text)
+                return vector
+        vector = self.embedder.embed([text])[0]
+        with self._lock:
+            self._embedded[text] = vector
+            if len(self._embedded) > 256:
+                self._embedded.popitem(last=False)
+        return vector
+
+    def get(self, namespace, text):
+        """Return the stored answer for the most similar question, or None"""
+        vector = self._embed(text)
+        with self._lock:
+            count = len(self._entries)
+            if count:
+                scores = self._vectors[:count] @ vector
+                # Only compare against questions asked through the same method,
+                # with the same negation and qualifiers
+                scores[self._namespaces[:count] != namespace] = -1.0
+                scores[self._guards[:count] != guard_key(text)] = -1.0
+                best = int(np.argmax(scores))
+                self.last_similarity = float(scores[best])
+                if scores[best] >= self.threshold:
+                    self._last_used[best] = time.time()
+                    self.hits += 1
+                    return self._entries[best]["answer"]
+            self.misses += 1
+            return None
+
+    def put(self, namespace, text, answer):
+        """Store an answer, overwriting the least recently used entry when full"""
+        vector = self._embed(text)
+        guard = guard_key(text)
+        entry = {"namespace": namespace, "question": text, "answer": answer}
+        with self._lock:
+            count = len(self._entries)
+            if count >= self.max_entries:
+                row = int(np.argmin(self._last_used[:count]))
+                self._entries[row] = entry
+                self.evictions += 1
+            else:
+                if count == len(self._vectors):
+                    self._grow()
+                row = count
+                self._entries.append(entry)
+            self._vectors[row] = vector
+            self._last_used[row] = time.time()
+            self._namespaces[row] = namespace
+            self._guards[row] = guard
+            self._unsaved += 1
+            autosave = self.path and self._unsaved >= self.autosave_every
+
+        if autosave:
+            self.save()
+
+    def save(self):
+        """Persist the index to `path`"""
+        if not self.path:
+            return
+        with self._lock:
+            tmp_path = self.path + ".tmp.npz"
+            count = len(self._entries)
+            np.savez(
+                tmp_path,
+                vectors=self._vectors[:count],
+                last_used=self._last_used[:count],
+                entries=np.array(json.dumps(self._entries)),
+            )
+            os.replace(tmp_path, self.path)
+            self._unsaved = 0
+
+    def load(self):
+        """Load a previously saved index from `path`"""
+        with np.load(self.path) as data:
+            vectors = data["vectors"]
+            if vectors.shape[1] != self.embedder.dim:
+                # Saved with a different embedder; start over rather than mix spaces
+                return
+            with self._lock:
+                self._vectors = vectors.astype(np.float32)
+                self._last_used = data["last_used"]
+                self._entries = json.loads(str(data["entries"]))
+                self._namespaces = np.array(
+                    [entry["namespace"] for entry in self._entries], dtype="<U64"
+                )
+                self._guards = np.array(
+                    [guard_key(entry["question"]) for entry in self._entries], dtype=np.int64
+                )
+
+    def clear(self):
+        """Remove every stored question"""
+        with self._lock:
+            self._allocate(0)
+            self._entries = []
+
+    def stats(self):
+        """Return hit-rate counters and index size"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "threshold": self.threshold,
+        }
+
+
+def semantic_cache_from_env(client):
+    """SemanticCache saved at SEMANTIC_CACHE_PATH, or None if it isn't set
+
+    SEMANTIC_CACHE_EMBEDDER=gemini embeds through `client`. Every instance
+    loads and autosaves the whole file, so build one per process and share it.
+    """
+    path = os.getenv('SEMANTIC_CACHE_PATH')
+    if not path:
+        return None
+    embedder = None
+    if os.getenv('SEMANTIC_CACHE_EMBEDDER') == 'gemini':
+        embedder = GeminiEmbedder(client)
+    return SemanticCache(embedder, path=path)
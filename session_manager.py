@@ -0,0 +1,101 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LiveSession:
+    """The in-memory objects behind one conversation"""
+
+    __slots__ = ("agent", "history")
+
+    def __init__(self, agent, history):
+        self.agent = agent
+        self.history = history
+
+
+class SessionManager:
+    """LRU of live sessions that evicts idle ones and rehydrates them on return
+
+    `load(key)` builds a session (from disk, for a returning user) and
+    `save(key, session)` persists whatever load() needs before an evicted
+    session's objects are dropped. Sessions idle for `idle_timeout` seconds,
+    or beyond `max_live`, are evicted least recently used first.
+    """
+
+    def __init__(self, load, save=None, max_live=200, idle_timeout=30 * 60,
+                 remember_evicted=10000):
+        """Manage sessions built by `load` and persisted by `save`"""
+        self.load = load
+        self.save = save
+        self.max_live = max_live
+        self.idle_timeout = idle_timeout
+        self.remember_evicted = remember_evicted
+
+        self.loads = 0
+        self.evictions = 0
+        self.rehydrations = 0
+
+        self._live = OrderedDict()
+        # Keys evicted and not yet back, so returns count as rehydrations
+        self._evicted = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the live session for `key`, loading it if it isn't in memory"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._live.get(key)
+            if entry is not None:
+                entry[1] = now
+                self._live.move_to_end(key)
+                session = entry[0]
+        if entry is None:
+            # Build outside the lock; a concurrent load of the same key keeps the first
+            loaded = self.load(key)
+            with self._lock:
+                entry = self._live.get(key)
+                if entry is None:
+                    entry = self._live[key] = [loaded, now]
+                    self.loads += 1
+                    if self._evicted.pop(key, None) is not None:
+                        self.rehydrations += 1
+                session = entry[0]
+        self.sweep()
+        return session
+
+    def sweep(self):
+        """Evict idle sessions and any beyond max_live; returns how many were evicted"""
+        cutoff = time.monotonic() - self.idle_timeout
+        evicted = []
+        with self._lock:
+            while self._live:
+                key, (session, last_used) = next(iter(self._live.items()))
+                if last_used >= cutoff and len(self._live) <= self.max_live:
+                    break
+                del self._live[key]
+                evicted.append((key, session))
+                self._evicted[key] = True
+                if len(self._evicted) > self.remember_evicted:
+                    self._evicted.popitem(last=False)
+            self.evictions += len(evicted)
+
+        for key, session in evicted:
+            if self.save is not None:
+                self.save(key, session)
+        return len(evicted)
+
+    def discard(self, key):
+        """Drop a session without saving it"""
+        with self._lock:
+            self._live.pop(key, None)
+
+    def stats(self):
+        """Return gauges for live and evicted sessions and the eviction counters"""
+        with self._lock:
+            return {
+                "live": len(self._live),
+                "evicted": len(self._evicted),
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "rehydrations": self.rehydrations,
+            }
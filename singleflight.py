@@ -0,0 +1,155 @@
+import threading
+
+
+class _Flight:
+    """State of one upstream call shared by every caller with the same key"""
+
+    def __init__(self):
+        self.chunks = []
+        self.result = None
+        self.error = None
+        self.done = False
+        # Callers reading a shared stream; when the last one leaves early the
+        # upstream stream is cancelled
+        self.readers = 0
+        self.cancelled = False
+        self.cond = threading.Condition()
+
+    def finish(self, result=None, error=None):
+        """Publish the outcome and wake every waiting caller"""
+        with self.cond:
+            self.result = result
+            self.error = error
+            self.done = True
+            self.cond.notify_all()
+
+
+class SingleFlight:
+    """Coalesce concurrent identical requests into a single upstream call"""
+
+    def __init__(self):
+        """Create an empty group; counters are cumulative for the process"""
+        self.calls = 0
+        self.coalesced = 0
+        self.cancelled = 0
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key):
+        """Return (flight, is_leader) for `key`"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                flight.readers += 1
+                return flight, False
+            flight = _Flight()
+            flight.readers = 1
+            self._flights[key] = flight
+            self.calls += 1
+            return flight, True
+
+    def _leave(self, key, flight):
+        """Drop a reader; the last one leaving an unfinished stream cancels it"""
+        with self._lock:
+            flight.readers -= 1
+            if flight.readers or flight.done:
+                return
+            flight.cancelled = True
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            self.cancelled += 1
+
+    def _forget(self, key, flight):
+        """Drop a finished flight so later requests start a fresh call"""
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def do(self, key, fn):
+        """Return fn(), sharing the call with concurrent callers using the same key"""
+        flight, leader = self._join(('call', key))
+        if leader:
+            try:
+                result = fn()
+            except BaseException as e:
+                self._forget(('call', key), flight)
+                flight.finish(error=e)
+                raise
+            self._forget(('call', key), flight)
+            flight.finish(result=result)
+            return result
+
+        with flight.cond:
+            flight.cond.wait_for(lambda: flight.done)
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def stream(self, key, fn):
+        """Yield the chunks of fn()'s iterator, sharing one upstream stream per key
+
+        The upstream iterator is drained by a background thread so a caller that
+        stops reading early does not stall the others; every caller replays the
+        chunks from the start. Once every caller has closed its iterator
+        before the end, the upstream iterator is closed at its next chunk.
+        """
+        flight, leader = self._join(('stream', key))
+        if leader:
+            threading.Thread(
+                target=self._pump, args=(('stream', key), flight, fn), daemon=True
+            ).start()
+        return self._follow(('stream', key), flight)
+
+    def _pump(self, key, flight, fn):
+        """Drain fn()'s iterator into the flight until it ends or every reader has left"""
+        try:
+            stream = fn()
+            for chunk in stream:
+                if flight.cancelled:
+                    if hasattr(stream, 'close'):
+                        # Closing the generator closes the underlying HTTP response
+                        stream.close()
+                    break
+                with flight.cond:
+                    flight.chunks.append(chunk)
+                    flight.cond.notify_all()
+        except BaseException as e:
+            self._forget(key, flight)
+            flight.finish(error=e)
+            return
+        self._forget(key, flight)
+        flight.finish()
+
+    def _follow(self, key, flight):
+        """Replay a flight's chunks, waiting for new ones until it finishes"""
+        try:
+            index = 0
+            while True:
+                with flight.cond:
+                    flight.cond.wait_for(lambda: flight.done or len(flight.chunks) > index)
+                    chunks = flight.chunks[index:]
+                    done = flight.done
+                for chunk in chunks:
+                    yield chunk
+                index += len(chunks)
+                if done and index >= len(flight.chunks):
+                    break
+        finally:
+            self._leave(key, flight)
+        if flight.error is not None:
+            raise flight.error
+
+    def stats(self):
+        """Return upstream call and coalesced request counters"""
+        with self._lock:
+            return {
+                'upstream_calls': self.calls,
+                'coalesced': self.coalesced,
+                'cancelled': self.cancelled,
+                'in_flight': len(self._flights),
+            }
+
+
+# Process-wide group so identical requests from different Streamlit sessions coalesce
+DEFAULT_GROUP = SingleFlight()
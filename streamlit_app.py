@@ -1,11 +1,34 @@
-import streamlit as st
-from google import genai
-from google.genai import types
+import functools
 import os
+import time
+import streamlit as st
 from dotenv import load_dotenv
+from agent import MODEL, SYSTEM_PROMPT, DataScienceExpertAgent
+from clients import get_shared_client, warm_up_in_background
+from context_cache import SystemPromptCache
+from conversation_store import ConversationStore
+from hedging import Hedger
+from jobs import JobManager
+from result_memo import ResultMemo
+from scheduler import BusyError, FairScheduler
+from recall import index_report
+from resilience import CircuitOpenError, is_retryable, resilience_from_env
+from session_manager import LiveSession, SessionManager
+from turn_history import Turn, TurnHistory, memory_report
+from tokens import PromptTooLargeError
+
+# CPU time per script run and page fragment, printed when STREAMLIT_CPU_LOG=1
+CPU_LOG = os.getenv('STREAMLIT_CPU_LOG') == '1'
+run_started = time.thread_time()
+
 
-# Load environment variables
-load_dotenv()
+@st.cache_resource
+def load_environment():
+    """Load .env once per process rather than on every rerun"""
+    load_dotenv()
+
+
+load_environment()
 
 # Page configuration
 st.set_page_config(
@@ -51,144 +74,315 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-class DataScienceExpertAgent:
-    def __init__(self):
-        """Initialize the Data Science Expert AI Agent"""
-        api_key = os.getenv('GEMINI_API_KEY')
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY not found in .env file")
-        
-        self.client = genai.Client(api_key=api_key)
-        
-        self.system_prompt = """You are a world-class Data Science Expert with 100 years of combined experience in:
-- Data Science & Analytics
-- Machine Learning & Deep Learning
-- Data Engineering & Big Data
-- Statistical Analysis & Mathematics
-- AI Research & Development
-- Business Intelligence & Visualization
-
-Your expertise includes:
-- Creating challenging, industry-level data science questions
-- Solving complex data problems with multiple approaches
-- Explaining advanced concepts clearly
-- Providing production-ready code examples
-- Reviewing and optimizing data pipelines
-- Mentoring and teaching at the highest level
-
-You can handle topics like:
-- Advanced ML algorithms (XGBoost, LightGBM, Neural Networks, Transformers)
-- Deep Learning (CNNs, RNNs, GANs, Transformers, BERT, GPT)
-- Statistical modeling and hypothesis testing
-- Big Data technologies (Spark, Hadoop, Kafka)
-- Data Engineering (ETL, Data Warehousing, Data Lakes)
-- MLOps and model deployment
-- Feature engineering and selection
-- Time series analysis and forecasting
-- NLP, Computer Vision, Recommender Systems
-- A/B testing and experimentation
-- Cloud platforms (AWS, GCP, Azure)
-
-Respond with expertise, precision, and practical examples."""
-        
-    def _send_message(self, prompt):
-        """Send message to Gemini"""
-        full_prompt = self.system_prompt + "\n\n" + prompt
-        
-        response = self.client.models.generate_content(
-            model='gemini-2.5-flash',
-            contents=full_prompt,
-            config=types.GenerateContentConfig(
-                temperature=0.7,
-                top_p=0.95,
-                top_k=40,
-                max_output_tokens=8192,
-            )
-        )
-        
-        return response.text
-    
-    def generate_hard_questions(self, topic, difficulty="expert", num_questions=5):
-        """Generate challenging data science questions"""
-        prompt = f"""As a 100-year experienced Data Science expert, generate {num_questions} {difficulty}-level questions on {topic}.
+def show_error(e):
+    """Render an upstream error with a hint on whether retrying will help"""
+    if isinstance(e, PromptTooLargeError):
+        st.warning(f"✂️ {e}")
+    elif isinstance(e, BusyError):
+        st.warning("🚦 Lots of people are using the agent right now. Please try again in a moment.")
+    elif isinstance(e, CircuitOpenError):
+        st.warning(f"⏳ Gemini is temporarily degraded. Please try again in {e.retry_in:.0f} seconds.")
+    elif is_retryable(e):
+        st.warning("⏳ Gemini is busy or rate limited right now. Please try again in a moment.")
+    else:
+        st.error(f"❌ Error: {str(e)}")
+
+
+@st.cache_resource
+def get_client():
+    """Create the process-wide Gemini client once and warm up its connection pool
+
+    The SDK import and first handshake happen on a background thread, so the
+    first page renders without waiting for them.
+    """
+    api_key = os.getenv('GEMINI_API_KEY')
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY not found in .env file")
+    client = get_shared_client(
+        api_key,
+        max_connections=int(os.getenv('GEMINI_MAX_CONNECTIONS', '100')),
+        max_keepalive_connections=int(os.getenv('GEMINI_MAX_KEEPALIVE', '20')),
+    )
+    warm_up_in_background(client)
+    return client
+
+
+@st.cache_resource
+def get_store():
+    """Open the conversation database shared by every session"""
+    return ConversationStore(os.getenv('CONVERSATION_DB_PATH', 'conversations.sqlite3'))
+
+
+@st.cache_resource
+def get_scheduler():
+    """Admission control shared by every session, so no one session can crowd out the rest"""
+    max_concurrent = int(os.getenv('GEMINI_MAX_CONCURRENT', '16'))
+    return FairScheduler(
+        max_concurrent=max_concurrent,
+        max_queue=int(os.getenv('GEMINI_MAX_QUEUE', '64')),
+        max_wait=float(os.getenv('GEMINI_QUEUE_TIMEOUT', '30')),
+        # Keep some slots free for chat replies
+        reserved=max(1, max_concurrent // 8) if max_concurrent > 1 else 0,
+    )
 
-Make these questions:
-- Highly challenging and thought-provoking
-- Industry/research-level difficulty
-- Requiring deep understanding and practical knowledge
-- Include edge cases and real-world scenarios
 
-Format each question clearly with numbering."""
+@st.cache_resource
+def get_resilience():
+    """Rate limiter and circuit breaker shared by every session, so together they stay within quota"""
+    return resilience_from_env()
 
-        return self._send_message(prompt)
-    
-    def answer_question(self, question):
-        """Answer data science questions with expert knowledge"""
-        prompt = f"""As a 100-year experienced Data Science expert, provide a comprehensive answer to:
 
-{question}
+@st.cache_resource
+def get_semantic_cache():
+    """One near-duplicate question cache (SEMANTIC_CACHE_PATH) for every session, or None"""
+    from semantic_cache import semantic_cache_from_env
+    return semantic_cache_from_env(get_client())
 
-Include:
-- Detailed explanation
-- Mathematical foundations (if applicable)
-- Code examples (Python/SQL when relevant)
-- Best practices
-- Common pitfalls to avoid
-- Real-world applications"""
 
-        return self._send_message(prompt)
-    
-    def review_code(self, code, context=""):
-        """Review and optimize data science code"""
-        prompt = f"""As a 100-year experienced Data Science expert, review this code:
+@st.cache_resource
+def get_hedger():
+    """One hedger (GEMINI_HEDGING=1) for every session, so latency samples and the budget are pooled"""
+    return Hedger() if os.getenv('GEMINI_HEDGING') == '1' else None
 
-Context: {context}
 
-Code:
-```
-{code}
-```
+@st.cache_resource
+def get_context_cache():
+    """One explicit system-prompt cache for every session (GEMINI_CONTEXT_CACHE_TTL), or None"""
+    ttl = int(os.getenv('GEMINI_CONTEXT_CACHE_TTL', '0'))
+    if not ttl:
+        return None
+    return SystemPromptCache(get_client(), MODEL, SYSTEM_PROMPT, ttl=ttl)
 
-Provide:
-- Code quality assessment
-- Performance optimization suggestions
-- Best practices recommendations
-- Potential bugs or issues
-- Improved version of the code"""
 
-        return self._send_message(prompt)
-    
-    def solve_problem(self, problem_description):
-        """Solve complex data science problems"""
-        prompt = f"""As a 100-year experienced Data Science expert, solve this problem:
+# Turns loaded from the conversation store, and shown on the chat page, at a time
+HISTORY_PAGE = 20
 
-{problem_description}
+# Resident size a session's loaded turns may reach before the oldest are spilled
+SESSION_MEMORY_CAP = int(os.getenv('SESSION_MEMORY_CAP_KB', '2048')) * 1024
 
-Provide:
-- Problem analysis
-- Multiple solution approaches
-- Step-by-step implementation
-- Code examples
-- Trade-offs and recommendations"""
 
-        return self._send_message(prompt)
-    
-    def chat_with_agent(self, message):
-        """General chat with the expert agent"""
-        return self._send_message(message)
+def load_session(session_id):
+    """Build a conversation's agent and history from the conversation store"""
+    store = get_store()
+    history = TurnHistory(store.recent(session_id, HISTORY_PAGE), max_bytes=SESSION_MEMORY_CAP)
+    agent = DataScienceExpertAgent(
+        client=get_client(),
+        context_cache=get_context_cache(),
+        resilience=get_resilience(),
+        semantic_cache=get_semantic_cache(),
+        hedger=get_hedger(),
+        scheduler=get_scheduler(),
+        session_id=session_id,
+    )
+    # Keep every prompt, response, timing and token count for export (see jsonl_export.py)
+    agent.recorder = functools.partial(store.record_artifact, session_id)
+    state = store.load_state(session_id) or {}
+    recall_turns = None
+    if agent.recall is not None:
+        # Index the whole conversation, keeping only ids; recalled text is read back
+        # from the store, and vectors are saved there once so restores don't re-embed
+        agent.recall.load = store.turns_by_id
+        agent.recall.save = functools.partial(store.save_vectors, agent.recall.embedder_key)
+        recall_turns = store.iter_turn_vectors(session_id, agent.recall.embedder_key)
+    agent.restore_conversation(history, summary=state.get('summary', ""), recall_turns=recall_turns)
+    return LiveSession(agent, history)
+
+
+def save_session(session_id, session):
+    """Save what the turns on disk don't capture before an idle session is dropped"""
+    get_store().save_state(session_id, {'summary': session.agent.memory.summary})
+
+
+@st.cache_resource
+def get_sessions():
+    """Process-wide LRU of live sessions; idle ones are saved and dropped until their user returns"""
+    return SessionManager(
+        load_session,
+        save_session,
+        max_live=int(os.getenv('MAX_LIVE_SESSIONS', '200')),
+        idle_timeout=int(os.getenv('SESSION_IDLE_TIMEOUT', '1800')),
+    )
 
 
-# Initialize session state
-if 'agent' not in st.session_state:
-    try:
-        st.session_state.agent = DataScienceExpertAgent()
-        st.session_state.initialized = True
-    except Exception as e:
-        st.session_state.initialized = False
-        st.session_state.error = str(e)
+@st.cache_resource
+def get_jobs():
+    """Worker pool shared by every session for requests that must survive reruns"""
+    return JobManager(max_workers=int(os.getenv('JOB_WORKERS', '16')))
 
-if 'chat_history' not in st.session_state:
-    st.session_state.chat_history = []
+
+# Bounds on the results each session keeps for pages it has already run
+RESULT_MEMO_ENTRIES = int(os.getenv('RESULT_MEMO_ENTRIES', '50'))
+RESULT_MEMO_BYTES = int(os.getenv('RESULT_MEMO_KB', '2048')) * 1024
+
+
+@st.cache_resource
+def get_shared_results():
+    """Results memoized across sessions when SHARED_RESULT_MEMO=1, else None"""
+    if os.getenv('SHARED_RESULT_MEMO') != '1':
+        return None
+    return ResultMemo(
+        max_entries=int(os.getenv('SHARED_RESULT_MEMO_ENTRIES', '1000')),
+        max_bytes=int(os.getenv('SHARED_RESULT_MEMO_MB', '50')) * 1024 * 1024,
+    )
+
+
+def result_memos():
+    """This session's result memo, then the cross-session one if enabled"""
+    shared = get_shared_results()
+    return [st.session_state.results] + ([shared] if shared is not None else [])
+
+
+def saved_result(page, inputs):
+    """Return the memoized result for `page` and `inputs` from this session, then any session"""
+    for memo in result_memos():
+        result = memo.get(page, inputs)
+        if result is not None:
+            st.session_state.results.put(page, inputs, result)
+            return result
+    return None
+
+
+def run_job(page, fn, inputs):
+    """Run fn() in the background for `page` unless its inputs already have a result
+
+    The same request already running is reused, and the finished output is
+    memoized under `inputs` so asking again doesn't send a new request.
+    """
+    if saved_result(page, inputs) is not None:
+        st.session_state.jobs.pop(page, None)
+        return
+    memos = result_memos()
+
+    def memoized():
+        result = fn()
+        if isinstance(result, str):
+            result = iter([result])
+        chunks = []
+        try:
+            for chunk in result:
+                chunks.append(chunk)
+                yield chunk
+        except GeneratorExit:
+            # Cancelled: close the agent's stream now and keep nothing
+            if hasattr(result, 'close'):
+                result.close()
+            raise
+        for memo in memos:
+            memo.put(page, inputs, "".join(chunks))
+
+    job = get_jobs().submit(memoized, key=(st.session_state.session_id, page, inputs))
+    st.session_state.jobs[page] = job.id
+
+
+def regenerate(page, fn, inputs):
+    """Forget the memoized result for `inputs` and request a fresh one"""
+    for memo in result_memos():
+        memo.invalidate(page, inputs)
+    run_job(page, fn, inputs)
+
+
+def show_job(page, fn, inputs, success_message):
+    """Render the result for `page`: a running job, the memoized result for `inputs`, or the latest job
+
+    A running job is polled in a fragment until it finishes.
+    """
+    job_id = st.session_state.jobs.get(page)
+    job = get_jobs().get(job_id) if job_id else None
+    saved = None
+    if job is None or (job.done and job.key[2] != inputs):
+        saved = saved_result(page, inputs)
+    if saved is not None:
+        st.markdown(saved)
+        st.success(success_message)
+        st.caption("♻️ Saved result for these inputs; no new request was sent.")
+    elif job is None:
+        return
+    else:
+        polling = not job.done
+
+        def job_output():
+            st.markdown(job.text)
+            if job.status == "failed":
+                show_error(job.error)
+            elif job.status == "done":
+                st.success(success_message)
+            elif job.status == "cancelled":
+                st.info("⏹️ Cancelled. Tokens generated before cancelling are still counted.")
+            else:
+                st.caption("⏳ Working on it... you can keep using the app meanwhile.")
+                st.button("⏹️ Cancel", key=f"cancel-{page}", on_click=get_jobs().cancel, args=(job.id,))
+            if polling and job.done:
+                # Redraw once without the polling timer
+                st.rerun()
+
+        st.fragment(job_output, run_every=1.0 if polling else None)()
+        if polling or job.key[2] != inputs:
+            return
+    st.button("🔄 Regenerate", key=f"regenerate-{page}", on_click=regenerate, args=(page, fn, inputs))
+
+
+def log_cpu(label, started):
+    """Print the CPU time this thread spent since `started` when STREAMLIT_CPU_LOG=1"""
+    if CPU_LOG:
+        print(f"[cpu] {label}: {(time.thread_time() - started) * 1000:.1f} ms", flush=True)
+
+
+def page(fn):
+    """Run a page as a fragment with the current live session, logging its CPU time"""
+    @st.fragment
+    @functools.wraps(fn)
+    def run():
+        started = time.thread_time()
+        # Looked up on every run, not closed over from the full run: a fragment
+        # rerun must mark the session as used so it isn't evicted as idle, and
+        # must not keep working on an instance that was evicted and reloaded
+        fn(get_sessions().get(st.session_state.session_id))
+        log_cpu(fn.__name__, started)
+    return run
+
+
+def open_conversation(session_id):
+    """Make `session_id` the current conversation; it is loaded on first use"""
+    # Conversations this browser session started or was linked to; search and
+    # Open are limited to these so one user can't browse another's chats
+    st.session_state.setdefault('my_sessions', set()).add(session_id)
+    st.session_state.session_id = session_id
+    st.query_params["session"] = session_id
+    st.session_state.chat_window = HISTORY_PAGE
+
+
+def load_earlier():
+    """Widen the chat window by a page, fetching older turns from the store as needed"""
+    history = get_sessions().get(st.session_state.session_id).history
+    st.session_state.chat_window += HISTORY_PAGE
+    missing = st.session_state.chat_window - len(history)
+    if missing > 0 and history:
+        earlier = get_store().recent(st.session_state.session_id, missing, before=history[0]["id"])
+        history.extend_front(earlier)
+        history.spill(keep=st.session_state.chat_window)
+
+
+# Initialize session state; only the conversation id lives here, the agent and
+# history are held by the session manager
+if 'session_id' not in st.session_state:
+    # The conversation id lives in the URL, so a reload or restart resumes it
+    open_conversation(st.query_params.get("session") or ConversationStore.new_session_id())
+
+# Latest background job id per page
+if 'jobs' not in st.session_state:
+    st.session_state.jobs = {}
+
+# Finished page results keyed on their inputs, so reruns and repeat clicks reuse them
+if 'results' not in st.session_state:
+    st.session_state.results = ResultMemo(max_entries=RESULT_MEMO_ENTRIES, max_bytes=RESULT_MEMO_BYTES)
+
+try:
+    session = get_sessions().get(st.session_state.session_id)
+    initialized = True
+except Exception as e:
+    session = None
+    initialized = False
+    init_error = str(e)
 
 # Header
 st.title("🤖 Data Science Expert AI Agent")
@@ -225,23 +419,102 @@ with st.sidebar:
         - Expert Consultations
         """)
     
-    # Clear history button
+    # Response cache counters
+    if initialized and session.agent.cache is not None:
+        cache_stats = session.agent.cache.stats()
+        st.caption(
+            f"🗄️ Cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses "
+            f"({cache_stats['entries']} entries)"
+        )
+    
+    # Prompt tokens served from Gemini's context cache
+    if initialized:
+        usage = session.agent.usage_report()
+        if usage['requests']:
+            st.caption(
+                f"🧮 Cached prompt tokens: {usage['cached_tokens']:,} / "
+                f"{usage['prompt_tokens']:,} ({usage['cached_ratio']:.0%})"
+            )
+    
+    # Resident size of loaded chat turns, for this session and the whole process
+    if initialized:
+        history_stats = session.history.stats()
+        recall_bytes = session.agent.recall.nbytes() if session.agent.recall is not None else 0
+        process = memory_report()
+        process_bytes = process['bytes'] + index_report()['bytes']
+        st.caption(
+            f"🧠 Chat memory: {history_stats['bytes'] / 1024:,.0f} KB for {history_stats['turns']} turns "
+            f"({history_stats['ratio']:.0%} of uncompressed, {history_stats['spilled']} spilled) "
+            f"+ {recall_bytes / 1024:,.0f} KB recall index; "
+            f"{process_bytes / 1024:,.0f} KB across {process['sessions']} sessions"
+        )
+
+    # Live versus evicted sessions in this process
+    sessions_stats = get_sessions().stats()
+    st.caption(
+        f"👥 Sessions: {sessions_stats['live']} live / {sessions_stats['evicted']} evicted "
+        f"({sessions_stats['rehydrations']} rehydrated)"
+    )
+
+    # Page results memoized for this session
+    results_stats = st.session_state.results.stats()
+    if results_stats['entries']:
+        st.caption(
+            f"💾 Saved results: {results_stats['entries']} "
+            f"({results_stats['bytes'] / 1024:,.0f} KB, {results_stats['hits']} reused)"
+        )
+        if st.button("🧹 Forget Saved Results"):
+            st.session_state.results.clear()
+            st.session_state.jobs.clear()
+            st.rerun()
+
+    # Upstream calls running and queued across all sessions
+    queue = get_scheduler().stats()
+    if queue['admitted'] or queue['rejected']:
+        st.caption(
+            f"🚦 Upstream: {queue['running']} running / {queue['queued']} queued, "
+            f"p95 wait {queue['wait_p95']:.1f}s ({queue['rejected'] + queue['timeouts']} turned away)"
+        )
+
+    # Clear history button (the old conversation stays searchable)
     if st.button("🗑️ Clear Chat History"):
-        st.session_state.chat_history = []
+        open_conversation(ConversationStore.new_session_id())
         st.rerun()
 
+    # Full-text search over this browser session's past conversations
+    search = st.text_input("🔎 Search past chats")
+    if search:
+        started = time.perf_counter()
+        results = get_store().search(search, limit=10, session_ids=st.session_state.my_sessions)
+        st.caption(f"{len(results)} matches in {(time.perf_counter() - started) * 1000:.1f} ms")
+        for result in results:
+            st.markdown(f"**{result['title']}**  \n{result['snippet']}")
+            opened = st.button("Open", key=f"open-{result['id']}")
+            if opened and result['session_id'] in st.session_state.my_sessions:
+                open_conversation(result['session_id'])
+                st.rerun()
+
 # Check if agent is initialized
-if not st.session_state.initialized:
-    st.error(f"❌ Error initializing agent: {st.session_state.error}")
+if not initialized:
+    st.error(f"❌ Error initializing agent: {init_error}")
     st.info("Please check your GEMINI_API_KEY in the .env file")
     st.stop()
 
-# Main content area
-if feature == "💬 Chat with Agent":
+# Main content area. Each page is a fragment, so its own widgets rerun only
+# the page; the header, CSS and sidebar are redrawn only on navigation.
+@page
+def chat_page(session):
+    """Chat with the agent"""
     st.header("💬 Chat with Data Science Expert")
     
-    # Display chat history
-    for i, chat in enumerate(st.session_state.chat_history):
+    # Display only the latest window of the chat history, so each rerun
+    # renders a bounded number of turns however long the conversation gets
+    shown = session.history[-st.session_state.chat_window:]
+    hidden = get_store().count(st.session_state.session_id) - len(shown)
+    if hidden > 0:
+        st.button(f"⬆️ Load earlier messages ({hidden} more)", on_click=load_earlier)
+
+    for chat in shown:
         with st.chat_message("user"):
             st.markdown(chat["user"])
         with st.chat_message("assistant"):
@@ -257,18 +530,28 @@ if feature == "💬 Chat with Agent":
         
         # Get response
         with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                response = st.session_state.agent.chat_with_agent(user_message)
-                st.markdown(response)
+            try:
+                response = st.write_stream(
+                    session.agent.chat_with_agent_stream(user_message)
+                )
+            except Exception as e:
+                show_error(e)
+                st.stop()
         
-        # Save to history
-        st.session_state.chat_history.append({
-            "user": user_message,
-            "assistant": response
-        })
-        st.rerun()
-
-elif feature == "❓ Generate Questions":
+        # Save to history, sharing the agent's record of the turn rather than copying it
+        turn = session.agent.last_turn
+        if turn is None or turn.id is not None or turn.user != user_message:
+            turn = Turn(None, user_message, response)
+        turn.id = get_store().append(st.session_state.session_id, user_message, response)
+        session.history.append(turn)
+        # Older turns stay in the conversation store and page back in on demand.
+        # The new turn is already on screen, so no rerun is needed to show it
+        session.history.spill(keep=st.session_state.chat_window)
+
+
+@page
+def questions_page(session):
+    """Generate hard questions on a topic"""
     st.header("❓ Generate Hard Questions")
     
     col1, col2 = st.columns([2, 1])
@@ -284,23 +567,26 @@ elif feature == "❓ Generate Questions":
         ["beginner", "intermediate", "expert", "research-level"]
     )
     
+    def generate():
+        return session.agent.generate_hard_questions_stream(
+            topic=topic,
+            difficulty=difficulty,
+            num_questions=num_questions
+        )
+
+    inputs = (topic, difficulty, num_questions)
     if st.button("🚀 Generate Questions"):
         if topic:
-            with st.spinner("Generating questions..."):
-                try:
-                    result = st.session_state.agent.generate_hard_questions(
-                        topic=topic,
-                        difficulty=difficulty,
-                        num_questions=num_questions
-                    )
-                    st.success("✅ Questions generated successfully!")
-                    st.markdown(result)
-                except Exception as e:
-                    st.error(f"❌ Error: {str(e)}")
+            run_job("questions", generate, inputs)
         else:
             st.warning("⚠️ Please enter a topic")
 
-elif feature == "🔍 Ask a Question":
+    show_job("questions", generate, inputs, "✅ Questions generated successfully!")
+
+
+@page
+def answer_page(session):
+    """Answer a data science question"""
     st.header("🔍 Ask a Question")
     
     question = st.text_area(
@@ -309,19 +595,21 @@ elif feature == "🔍 Ask a Question":
         placeholder="e.g., What is the difference between L1 and L2 regularization?"
     )
     
+    def answer():
+        return session.agent.answer_question_stream(question)
+
     if st.button("🔎 Get Answer"):
         if question:
-            with st.spinner("Generating comprehensive answer..."):
-                try:
-                    result = st.session_state.agent.answer_question(question)
-                    st.success("✅ Answer generated!")
-                    st.markdown(result)
-                except Exception as e:
-                    st.error(f"❌ Error: {str(e)}")
+            run_job("answer", answer, question)
         else:
             st.warning("⚠️ Please enter a question")
 
-elif feature == "📝 Review Code":
+    show_job("answer", answer, question, "✅ Answer generated!")
+
+
+@page
+def review_page(session):
+    """Review a code snippet"""
     st.header("📝 Code Review")
     
     context = st.text_input(
@@ -341,19 +629,21 @@ X_train, X_test, y_train, y_test = train_test_split(df.drop('target', axis=1), d
 """
     )
     
+    def review():
+        return session.agent.review_code_stream(code, context)
+
     if st.button("🔍 Review Code"):
         if code:
-            with st.spinner("Reviewing your code..."):
-                try:
-                    result = st.session_state.agent.review_code(code, context)
-                    st.success("✅ Code review completed!")
-                    st.markdown(result)
-                except Exception as e:
-                    st.error(f"❌ Error: {str(e)}")
+            run_job("review", review, (code, context))
         else:
             st.warning("⚠️ Please paste some code to review")
 
-elif feature == "🧩 Solve a Problem":
+    show_job("review", review, (code, context), "✅ Code review completed!")
+
+
+@page
+def solve_page(session):
+    """Solve a data science problem"""
     st.header("🧩 Solve a Data Science Problem")
     
     problem = st.text_area(
@@ -363,22 +653,33 @@ elif feature == "🧩 Solve a Problem":
 How should I approach training a classifier for this scenario?"""
     )
     
+    def solve():
+        return session.agent.solve_problem_stream(problem)
+
     if st.button("🚀 Solve Problem"):
         if problem:
-            with st.spinner("Analyzing and solving your problem..."):
-                try:
-                    result = st.session_state.agent.solve_problem(problem)
-                    st.success("✅ Solution generated!")
-                    st.markdown(result)
-                except Exception as e:
-                    st.error(f"❌ Error: {str(e)}")
+            run_job("solve", solve, problem)
         else:
             st.warning("⚠️ Please describe your problem")
 
+    show_job("solve", solve, problem, "✅ Solution generated!")
+
+
+PAGES = {
+    "💬 Chat with Agent": chat_page,
+    "❓ Generate Questions": questions_page,
+    "🔍 Ask a Question": answer_page,
+    "📝 Review Code": review_page,
+    "🧩 Solve a Problem": solve_page,
+}
+PAGES[feature]()
+
 # Footer
 st.markdown("---")
 st.markdown("""
     <div style='text-align: center; color: #666;'>
         <p>Powered by Google Gemini 2.5 Flash | Built with Streamlit</p>
     </div>
-""", unsafe_allow_html=True)
\ No newline at end of file
+""", unsafe_allow_html=True)
+
+log_cpu("full run", run_started)
@@ -0,0 +1,75 @@
+from concurrent.futures import ThreadPoolExecutor
+
+# Shared by every session in the process; summaries are small and infrequent
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="chat-summary")
+
+SUMMARY_PROMPT = """Update the running summary of a conversation between a user and a data science expert.
+
+Keep every decision, constraint, dataset detail, code choice and open question that later turns may refer to. Drop pleasantries and repetition. Write compact bullet points, at most {max_words} words in total.
+
+Current summary:
+{summary}
+
+New turns to fold in:
+{turns}
+
+Updated summary:"""
+
+
+class Summarizer:
+    """Folds old chat turns into a running summary on a background worker"""
+
+    def __init__(self, client, model="gemini-2.5-flash-lite", max_words=300, resilience=None):
+        """Summarize with `model`, which can be cheaper than the chat model"""
+        self.client = client
+        self.model = model
+        self.max_words = max_words
+        self.resilience = resilience
+        self.runs = 0
+        self.failures = 0
+
+    def summarize(self, summary, turns):
+        """Return a new summary covering `summary` plus `turns`"""
+        transcript = "\n\n".join(
+            f"User: {turn['user']}\nExpert: {turn['assistant']}" for turn in turns
+        )
+        prompt = SUMMARY_PROMPT.format(
+            max_words=self.max_words, summary=summary or "(none yet)", turns=transcript
+        )
+
+        def call():
+            from google.genai import types
+
+            return self.client.models.generate_content(
+                model=self.model,
+                contents=prompt,
+                config=types.GenerateContentConfig(
+                    temperature=0.2,
+                    max_output_tokens=self.max_words * 3,
+                ),
+            )
+
+        response = self.resilience.call(call) if self.resilience is not None else call()
+        return (response.text or "").strip()
+
+    def schedule(self, memory):
+        """Fold due turns of `memory` in the background; returns the future or None"""
+        folded = memory.claim_foldable()
+        if folded is None:
+            return None
+        return _executor.submit(self._fold, memory, memory.summary, folded)
+
+    def _fold(self, memory, summary, folded):
+        """Summarize claimed turns and swap them out of the memory"""
+        try:
+            new_summary = self.summarize(summary, folded)
+        except Exception:
+            # Leave the turns in place; the hard token budget still bounds the window
+            self.failures += 1
+            memory.release()
+            return False
+        if not new_summary:
+            memory.release()
+            return False
+        self.runs += 1
+        return memory.apply_summary(new_summary, folded)
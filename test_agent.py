@@ -1,8 +1,10 @@
  
+from dotenv import load_dotenv
 from agent import DataScienceExpertAgent
 
 def test_agent():
     """Test the Data Science Expert Agent"""
+    load_dotenv()
     print("=" * 70)
     print("🧪 TESTING DATA SCIENCE EXPERT AI AGENT")
     print("=" * 70)
@@ -0,0 +1,93 @@
+import threading
+import pytest
+from hedging import Hedger
+
+
+def primed(**kwargs):
+    """A hedger that has already learned a short first-chunk latency"""
+    hedger = Hedger(min_samples=1, budget=1.0, min_delay=0.01, **kwargs)
+    hedger.samples.extend([0.001] * 10)
+    return hedger
+
+
+def test_no_hedge_while_still_learning():
+    """Without enough latency samples the primary request is simply streamed"""
+    hedger = Hedger(min_samples=20)
+    assert list(hedger.run(lambda: iter(["a", "b"]))) == ["a", "b"]
+    stats = hedger.stats()
+    assert stats['hedges'] == 0
+    assert stats['hedge_delay'] is None
+
+
+def test_slow_primary_is_hedged_and_cancelled():
+    """A primary slower than the learned delay loses to the hedge and is closed"""
+    hedger = primed()
+    gate, closed = threading.Event(), threading.Event()
+    attempts = []
+
+    def slow():
+        try:
+            gate.wait(2)
+            yield "slow"
+            yield "slow again"
+        finally:
+            closed.set()
+
+    def make_stream():
+        attempts.append(1)
+        return slow() if len(attempts) == 1 else iter(["fast", "done"])
+
+    assert list(hedger.run(make_stream)) == ["fast", "done"]
+    gate.set()
+    assert closed.wait(2)
+    stats = hedger.stats()
+    assert stats['hedges'] == 1
+    assert stats['hedge_wins'] == 1
+
+
+def test_hedges_stay_within_budget():
+    """With no budget left the slow primary is waited for rather than hedged"""
+    hedger = Hedger(min_samples=1, budget=0.0, min_delay=0.01)
+    hedger.samples.extend([0.001] * 10)
+    gate = threading.Event()
+    threading.Timer(0.05, gate.set).start()
+
+    def slow():
+        gate.wait(2)
+        yield "slow"
+
+    assert list(hedger.run(slow)) == ["slow"]
+    assert hedger.stats()['hedges'] == 0
+
+
+def test_primary_error_surfaces_when_every_attempt_fails():
+    """If no attempt succeeds the primary's error is raised"""
+    hedger = Hedger()
+
+    def failing():
+        raise ValueError("bad request")
+        yield
+
+    with pytest.raises(ValueError):
+        list(hedger.run(failing))
+
+
+def test_closing_the_reader_cancels_the_winner():
+    """A reader that stops early stops the winning stream too"""
+    hedger = Hedger()
+    gate, closed = threading.Event(), threading.Event()
+
+    def stream():
+        try:
+            yield "a"
+            gate.wait(2)
+            yield "b"
+            yield "c"
+        finally:
+            closed.set()
+
+    reader = hedger.run(stream)
+    assert next(reader) == "a"
+    reader.close()
+    gate.set()
+    assert closed.wait(2)
@@ -0,0 +1,41 @@
+import os
+import subprocess
+import sys
+
+# Cumulative microseconds `import agent` may take; importing google.genai alone costs ~500 ms
+IMPORT_BUDGET_US = 250_000
+
+# Modules that must only be imported once a request is made
+LAZY_MODULES = ("google.genai", "numpy", "httpx", "dotenv")
+
+
+def import_times(module):
+    """Run `python -X importtime -c "import <module>"` and return {module: cumulative us}"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_agent_import_is_lazy():
+    """Importing the agent must not pull in the SDK or other heavy dependencies"""
+    times = import_times("agent")
+    heavy = sorted(
+        name for name in times
+        if any(name == lazy or name.startswith(lazy + ".") for lazy in LAZY_MODULES)
+    )
+    assert not heavy, f"imported at module load: {heavy[:5]}"
+    assert times["agent"] <= IMPORT_BUDGET_US, (
+        f"import agent took {times['agent'] / 1000:.0f} ms, budget {IMPORT_BUDGET_US / 1000:.0f} ms"
+    )
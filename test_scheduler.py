@@ -0,0 +1,152 @@
+import asyncio
+import contextlib
+import threading
+import types
+import pytest
+import scheduler
+from scheduler import BusyError, FairScheduler
+
+
+def hold(sched, stack, key="holder", priority="standard"):
+    """Take a slot for the rest of the test (or until `stack` is closed)"""
+    stack.enter_context(sched.slot(key, priority=priority))
+
+
+def queue(sched, order, key, cost=0, priority="standard"):
+    """Queue a call that records its key in `order` when granted"""
+    return sched._enqueue(key, cost, priority, lambda: order.append(key))
+
+
+def drain(sched, count):
+    """Finish `count` granted calls, one at a time, so each hands its slot to the next"""
+    for _ in range(count):
+        sched._release()
+
+
+def test_priority_classes_are_served_highest_first():
+    """Interactive calls overtake standard ones, which overtake bulk"""
+    sched = FairScheduler(max_concurrent=1)
+    order = []
+    with contextlib.ExitStack() as stack:
+        hold(sched, stack)
+        queue(sched, order, "bulk", priority="bulk")
+        queue(sched, order, "standard", priority="standard")
+        queue(sched, order, "chat", priority="interactive")
+    drain(sched, 3)
+    assert order == ["chat", "standard", "bulk"]
+    assert sched.stats()['running'] == 0
+
+
+def test_sessions_take_turns_by_deficit_round_robin():
+    """Equal-cost sessions alternate; a session sending larger calls gets fewer turns"""
+    sched = FairScheduler(max_concurrent=1, quantum=100)
+    order = []
+    with contextlib.ExitStack() as stack:
+        hold(sched, stack)
+        for _ in range(3):
+            queue(sched, order, "a", cost=100)
+            queue(sched, order, "b", cost=100)
+    drain(sched, 6)
+    assert order == ["a", "b", "a", "b", "a", "b"]
+
+    order.clear()
+    with contextlib.ExitStack() as stack:
+        hold(sched, stack)
+        for _ in range(4):
+            queue(sched, order, "light", cost=100)
+        queue(sched, order, "heavy", cost=300)
+    drain(sched, 5)
+    assert order == ["light", "light", "light", "heavy", "light"]
+
+
+def test_reserved_slots_only_go_to_interactive_calls():
+    """Standard calls queue at the reserve while an interactive call still gets a slot"""
+    sched = FairScheduler(max_concurrent=2, reserved=1)
+    order = []
+    with contextlib.ExitStack() as stack:
+        hold(sched, stack)
+        standard = queue(sched, order, "standard")
+        chat = queue(sched, order, "chat", priority="interactive")
+        assert chat.granted and not standard.granted
+        assert order == ["chat"]
+    # Standard calls may only fill one slot, which the chat call now holds
+    assert not standard.granted
+    drain(sched, 1)
+    assert standard.granted
+
+
+def test_full_queue_is_rejected_with_its_depth():
+    """Past max_queue a call fails at once, reporting how many were waiting"""
+    sched = FairScheduler(max_concurrent=1, max_queue=1)
+    with contextlib.ExitStack() as stack:
+        hold(sched, stack)
+        queue(sched, [], "waiting")
+        with pytest.raises(BusyError) as raised:
+            queue(sched, [], "rejected")
+        assert raised.value.queued == 2
+        assert "2 requests waiting" in str(raised.value)
+        stats = sched.stats()
+        assert stats['rejected'] == 1
+        assert stats['queued'] == 1
+
+
+def test_queued_call_times_out():
+    """A call still queued after max_wait raises BusyError and leaves the queue"""
+    sched = FairScheduler(max_concurrent=1, max_wait=0.01)
+    with contextlib.ExitStack() as stack:
+        hold(sched, stack)
+        with pytest.raises(BusyError):
+            with sched.slot("late"):
+                pass
+        stats = sched.stats()
+        assert stats['timeouts'] == 1
+        assert stats['queued'] == 0
+    assert sched.stats()['running'] == 0
+
+
+def test_grant_racing_a_timeout_keeps_the_slot(monkeypatch):
+    """A slot granted just as the wait times out is used and released, not leaked"""
+    sched = FairScheduler(max_concurrent=1, max_wait=0.01)
+    stack = contextlib.ExitStack()
+    hold(sched, stack)
+
+    class LateEvent(threading.Event):
+        def wait(self, timeout=None):
+            # The holder finishes, granting the queued call, as the wait gives up
+            stack.close()
+            return False
+
+    monkeypatch.setattr(scheduler, "threading", types.SimpleNamespace(Event=LateEvent))
+    with sched.slot("late"):
+        assert sched.stats()['running'] == 1
+    stats = sched.stats()
+    assert stats['running'] == 0
+    assert stats['queued'] == 0
+    assert stats['timeouts'] == 0
+
+
+def test_aslot_waits_without_blocking_the_loop():
+    """An async caller queues until a slot frees up, then runs"""
+    sched = FairScheduler(max_concurrent=1)
+    order = []
+
+    async def call(key):
+        async with sched.aslot(key):
+            order.append(key)
+            await asyncio.sleep(0)
+
+    async def main():
+        await asyncio.gather(call("a"), call("b"), call("c"))
+
+    asyncio.run(main())
+    assert order == ["a", "b", "c"]
+    assert sched.stats()['running'] == 0
+
+
+def test_rejects_bad_configuration():
+    """The reserve must leave a slot for other calls, and priorities must be known"""
+    with pytest.raises(ValueError):
+        FairScheduler(max_concurrent=1, reserved=1)
+    with pytest.raises(ValueError):
+        with FairScheduler().slot("key", priority="urgent"):
+            pass
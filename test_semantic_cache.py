@@ -0,0 +1,73 @@
+import pytest
+from semantic_cache import SemanticCache
+
+# Near-misses: embed close together, but need different answers
+NEAR_MISSES = [
+    ("When should I use mean imputation?", "When should I not use mean imputation?"),
+    ("Why does my model overfit?", "Why doesn't my model overfit?"),
+    ("What is a Type I error?", "What is a Type II error?"),
+    ("Is a p-value of 0.04 significant?", "Is a p-value of 0.4 significant?"),
+    ("What is L1 regularization?", "What is L2 regularization?"),
+]
+
+# Paraphrases that should still be served from the cache
+PARAPHRASES = [
+    ("What is the difference between L1 and L2 regularization?",
+     "Explain the difference between L1 and L2 regularisation"),
+    ("How do I handle missing values in pandas?", "how do I handle missing values in pandas"),
+    ("When should I not use mean imputation?", "When should I not use mean imputation"),
+]
+
+
+@pytest.mark.parametrize("stored, asked", NEAR_MISSES + [(b, a) for a, b in NEAR_MISSES])
+def test_near_misses_are_not_served(stored, asked):
+    """A stored answer never comes back for a negated or differently numbered question"""
+    cache = SemanticCache()
+    cache.put("answer_question", stored, "stored answer")
+    assert cache.get("answer_question", asked) is None
+
+
+@pytest.mark.parametrize("stored, asked", PARAPHRASES)
+def test_paraphrases_are_served(stored, asked):
+    """Rewordings and spelling variants still hit"""
+    cache = SemanticCache()
+    cache.put("answer_question", stored, "stored answer")
+    assert cache.get("answer_question", asked) == "stored answer"
+
+
+def test_guards_survive_save_and_load(tmp_path):
+    """A reloaded index still refuses near-misses"""
+    path = str(tmp_path / "semantic.npz")
+    cache = SemanticCache(path=path)
+    cache.put("answer_question", "What is a Type I error?", "type one")
+    cache.save()
+
+    reloaded = SemanticCache(path=path)
+    assert reloaded.get("answer_question", "What is a Type I error") == "type one"
+    assert reloaded.get("answer_question", "What is a Type II error?") is None
+
+
+def test_full_cache_replaces_least_recently_used(tmp_path):
+    """Past max_entries the least recently used question makes room, and the rest survive a reload"""
+    path = str(tmp_path / "semantic.npz")
+    cache = SemanticCache(max_entries=20, path=path)
+    topics = [
+        "bagging", "boosting", "dropout", "embeddings", "kriging", "lasso", "momentum",
+        "normalization", "outliers", "pruning", "quantiles", "ridge", "sampling", "tokenizers",
+        "upsampling", "variance", "whitening", "xgboost", "yolo", "zscores", "autoencoders",
+    ]
+    questions = [f"What is {topic}?" for topic in topics]
+    for question in questions[:20]:
+        cache.put("answer_question", question, question)
+    # Touch the oldest so the second oldest is evicted instead
+    assert cache.get("answer_question", questions[0]) == questions[0]
+    cache.put("answer_question", questions[20], questions[20])
+
+    assert cache.stats()["entries"] == 20
+    assert cache.stats()["evictions"] == 1
+    assert cache.get("answer_question", questions[1]) is None
+    cache.save()
+
+    reloaded = SemanticCache(max_entries=20, path=path)
+    for question in questions[:1] + questions[2:]:
+        assert reloaded.get("answer_question", question) == question
@@ -0,0 +1,113 @@
+import threading
+import time
+import pytest
+from singleflight import SingleFlight
+
+
+def wait_until(condition, timeout=2.0):
+    """Poll `condition` until it holds; fails the test on timeout"""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def gated(chunks, gate, closed):
+    """Yield the first chunk, wait for `gate`, then the rest; sets `closed` when closed or done"""
+    try:
+        yield chunks[0]
+        gate.wait(2)
+        yield from chunks[1:]
+    finally:
+        closed.set()
+
+
+def test_do_shares_one_call_between_concurrent_callers():
+    """A second caller with the same key waits for the first call's result"""
+    group = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    results = []
+
+    def fn():
+        started.set()
+        release.wait(2)
+        return "answer"
+
+    leader = threading.Thread(target=lambda: results.append(group.do("k", fn)))
+    leader.start()
+    started.wait(2)
+    follower = threading.Thread(target=lambda: results.append(group.do("k", fn)))
+    follower.start()
+    wait_until(lambda: group.stats()['coalesced'] == 1)
+    release.set()
+    leader.join(2)
+    follower.join(2)
+
+    assert results == ["answer", "answer"]
+    assert group.stats()['upstream_calls'] == 1
+    assert group.stats()['in_flight'] == 0
+
+
+def test_do_errors_reach_every_caller_and_are_not_kept():
+    """A failed call raises for the caller and the next call starts afresh"""
+    group = SingleFlight()
+
+    def fail():
+        raise RuntimeError("upstream down")
+
+    with pytest.raises(RuntimeError):
+        group.do("k", fail)
+    assert group.do("k", lambda: "recovered") == "recovered"
+    assert group.stats()['upstream_calls'] == 2
+
+
+def test_stream_replays_one_upstream_stream_to_every_reader():
+    """Readers joining the same key all get every chunk from a single call"""
+    group = SingleFlight()
+    gate, closed = threading.Event(), threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        return gated(["a", "b", "c"], gate, closed)
+
+    first = group.stream("k", fn)
+    second = group.stream("k", fn)
+    gate.set()
+    assert list(first) == ["a", "b", "c"]
+    assert list(second) == ["a", "b", "c"]
+    assert len(calls) == 1
+    assert group.stats()['coalesced'] == 1
+
+
+def test_stream_keeps_running_while_any_reader_remains():
+    """One reader closing early doesn't cut the stream short for the others"""
+    group = SingleFlight()
+    gate, closed = threading.Event(), threading.Event()
+    upstream = gated(["a", "b", "c"], gate, closed)
+
+    first = group.stream("k", lambda: upstream)
+    second = group.stream("k", lambda: upstream)
+    assert next(first) == "a"
+    first.close()
+    gate.set()
+    assert list(second) == ["a", "b", "c"]
+    assert group.stats()['cancelled'] == 0
+
+
+def test_stream_is_cancelled_when_the_last_reader_leaves():
+    """The upstream stream is closed at its next chunk once nobody is reading"""
+    group = SingleFlight()
+    gate, closed = threading.Event(), threading.Event()
+
+    reader = group.stream("k", lambda: gated(["a", "b", "c"], gate, closed))
+    assert next(reader) == "a"
+    reader.close()
+    gate.set()
+
+    assert closed.wait(2)
+    stats = group.stats()
+    assert stats['cancelled'] == 1
+    assert stats['in_flight'] == 0
+    # A new request for the key starts a fresh upstream stream
+    assert list(group.stream("k", lambda: iter(["x"]))) == ["x"]
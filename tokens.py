@@ -0,0 +1,157 @@
+import functools
+import math
+import re
+import threading
+
+# Gemini 2.5 Flash limits
+CONTEXT_WINDOW = 1048576
+MAX_OUTPUT_TOKENS = 65536
+
+_PIECES = re.compile(r"[A-Za-z]+|\d+|\s{2,}|[^\sA-Za-z\d]")
+
+
+class PromptTooLargeError(ValueError):
+    """Raised before sending when an input would exceed the token budget"""
+
+    def __init__(self, tokens, budget):
+        """Record the estimated size and the budget it exceeded"""
+        super().__init__(
+            f"Input is about {tokens:,} tokens, over the {budget:,} token limit. "
+            "Please shorten it or split it into smaller parts."
+        )
+        self.tokens = tokens
+        self.budget = budget
+
+
+def _measure(text):
+    """Tokenizer-agnostic size of a piece of text"""
+    units = 0
+    for piece in _PIECES.findall(text):
+        if piece[0].isalpha():
+            # Common words are one token; long or rare words split into ~4-char pieces
+            units += 1 if len(piece) <= 6 else math.ceil(len(piece) / 4)
+        elif piece[0].isdigit():
+            units += math.ceil(len(piece) / 3)
+        elif piece[0].isspace():
+            units += math.ceil(len(piece) / 8)
+        else:
+            units += 1
+    return units
+
+
+# Fragments up to this many characters (the system prompt, templates, short
+# messages) are memoized; larger ones, such as code pastes, are measured each
+# time so the cache never pins them in memory
+MEMO_MAX_CHARS = 4096
+
+
+@functools.lru_cache(maxsize=256)
+def _memo_units(text):
+    """Memoized _measure() for small fragments"""
+    return _measure(text)
+
+
+def _units(text):
+    """Size of a prompt fragment; small repeated fragments (the system prompt) are free"""
+    if len(text) > MEMO_MAX_CHARS:
+        return _measure(text)
+    return _memo_units(text)
+
+
+class TokenEstimator:
+    """Local token estimator calibrated against Gemini's own counts
+
+    Fragments are measured in tokenizer-agnostic units (memoized for small
+    fragments) and scaled by a tokens-per-unit ratio that tracks the counts
+    reported by count_tokens and usage_metadata.
+    """
+
+    def __init__(self, ratio=1.1, smoothing=0.2):
+        """Start from `ratio` tokens per unit; `smoothing` weights new observations"""
+        self.ratio = ratio
+        self.smoothing = smoothing
+        self.observations = 0
+        self._lock = threading.Lock()
+
+    def estimate(self, *fragments):
+        """Estimated token count of the fragments sent together"""
+        units = sum(_units(fragment) for fragment in fragments if fragment)
+        return math.ceil(units * self.ratio)
+
+    def observe(self, actual_tokens, *fragments):
+        """Update the ratio from a known token count for the fragments"""
+        units = sum(_units(fragment) for fragment in fragments if fragment)
+        if not units or not actual_tokens:
+            return
+        with self._lock:
+            observed = actual_tokens / units
+            if self.observations == 0:
+                self.ratio = observed
+            else:
+                self.ratio += self.smoothing * (observed - self.ratio)
+            self.observations += 1
+
+    def calibrate(self, client, model, samples):
+        """Calibrate with count_tokens on sample texts; returns the new ratio"""
+        for text in samples:
+            result = client.models.count_tokens(model=model, contents=text)
+            self.observe(result.total_tokens, text)
+        return self.ratio
+
+    def _line_tokens(self, line):
+        """Estimate for one line, kept out of the fragment memo so big pastes don't flush it"""
+        return math.ceil(_measure(line) * self.ratio)
+
+    def truncate(self, text, max_tokens):
+        """Cut `text` to roughly `max_tokens`, on a line boundary where possible"""
+        total = math.ceil(_measure(text) * self.ratio)
+        if total <= max_tokens:
+            return text
+        lines = text.splitlines(keepends=True)
+        kept = []
+        used = 0
+        for line in lines:
+            cost = self._line_tokens(line)
+            if used + cost > max_tokens:
+                break
+            kept.append(line)
+            used += cost
+        if not kept:
+            # A single enormous line: cut by characters at the observed density
+            chars = int(len(text) * max_tokens / max(total, 1))
+            return text[:chars] + "\n... [truncated]"
+        return "".join(kept) + f"\n... [truncated {len(lines) - len(kept)} more lines]"
+
+    def chunk(self, text, max_tokens):
+        """Split `text` into line-aligned pieces of at most ~`max_tokens` each"""
+        chunks = []
+        current = []
+        used = 0
+        for line in text.splitlines(keepends=True):
+            cost = self._line_tokens(line)
+            if cost > max_tokens:
+                # Split a single oversized line by characters at its own density
+                step = max(int(len(line) * max_tokens / cost), 1)
+                pieces = [line[i:i + step] for i in range(0, len(line), step)]
+                if current:
+                    chunks.append("".join(current))
+                chunks.extend(pieces[:-1])
+                current, used = [pieces[-1]], self._line_tokens(pieces[-1])
+                continue
+            if current and used + cost > max_tokens:
+                chunks.append("".join(current))
+                current, used = [], 0
+            current.append(line)
+            used += cost
+        if current:
+            chunks.append("".join(current))
+        return chunks
+
+
+# Shared default so calibration benefits every agent in the process
+DEFAULT_ESTIMATOR = TokenEstimator()
+
+
+def estimate_tokens(text):
+    """Estimate tokens for `text` with the shared estimator"""
+    return DEFAULT_ESTIMATOR.estimate(text)
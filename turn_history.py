@@ -0,0 +1,167 @@
+import sys
+import threading
+import time
+import weakref
+import zlib
+
+# Every live history in the process, for memory_report()
+_histories = weakref.WeakSet()
+_histories_lock = threading.Lock()
+
+
+class Turn:
+    """One chat turn; the assistant text is stored zlib-compressed once the turn goes cold"""
+
+    __slots__ = ("id", "user", "created", "_assistant", "_raw_size")
+
+    # Below this many bytes compression isn't worth the CPU
+    min_compress_bytes = 1024
+
+    def __init__(self, id, user, assistant, created=None):
+        """Create a turn holding plain text"""
+        self.id = id
+        self.user = user
+        self.created = created if created is not None else time.time()
+        self._assistant = assistant
+        self._raw_size = sys.getsizeof(assistant)
+
+    @property
+    def assistant(self):
+        """The assistant reply, decompressed on access if needed"""
+        if isinstance(self._assistant, bytes):
+            return zlib.decompress(self._assistant).decode("utf-8")
+        return self._assistant
+
+    @property
+    def compressed(self):
+        """True if the assistant reply is held compressed"""
+        return isinstance(self._assistant, bytes)
+
+    def compress(self):
+        """Compress the assistant reply in place; returns True if it shrank"""
+        if self.compressed:
+            return False
+        raw = self._assistant.encode("utf-8")
+        if len(raw) < self.min_compress_bytes:
+            return False
+        packed = zlib.compress(raw, 6)
+        if len(packed) >= len(raw):
+            return False
+        self._assistant = packed
+        return True
+
+    def nbytes(self):
+        """Approximate resident size of the turn"""
+        return (
+            sys.getsizeof(self) + sys.getsizeof(self.user) + sys.getsizeof(self._assistant)
+        )
+
+    def raw_bytes(self):
+        """Size the turn would take with the reply held as plain text"""
+        return sys.getsizeof(self) + sys.getsizeof(self.user) + self._raw_size
+
+    def __getitem__(self, key):
+        """Dict-style access (turn["user"]) for code written against plain dict turns"""
+        if key not in ("id", "user", "assistant", "created"):
+            raise KeyError(key)
+        return getattr(self, key)
+
+
+def as_turn(turn):
+    """Return `turn` as a Turn, building one from a turn dict if needed"""
+    if isinstance(turn, Turn):
+        return turn
+    return Turn(turn.get("id"), turn["user"], turn["assistant"], turn.get("created"))
+
+
+class TurnHistory:
+    """A session's loaded chat turns, kept compact and within a memory cap
+
+    The newest `hot_turns` replies stay as plain text; older ones are
+    compressed. When the history grows past `max_bytes` the oldest turns are
+    spilled: dropped from memory, since the conversation store already holds
+    them on disk and pages them back in on request. The agent's chat memory
+    holds the same Turn objects rather than copies, so this is the session's
+    resident copy of its turns.
+    """
+
+    def __init__(self, turns=(), hot_turns=4, max_bytes=2 * 1024 * 1024):
+        """Create a history from turn dicts or Turn objects, oldest first"""
+        self.hot_turns = hot_turns
+        self.max_bytes = max_bytes
+        self.spilled = 0
+        self._turns = []
+        self._nbytes = 0
+        self.extend_front(turns)
+        with _histories_lock:
+            _histories.add(self)
+
+    def __len__(self):
+        return len(self._turns)
+
+    def __iter__(self):
+        return iter(self._turns)
+
+    def __getitem__(self, index):
+        return self._turns[index]
+
+    @property
+    def nbytes(self):
+        """Approximate resident size of the loaded turns"""
+        return self._nbytes
+
+    def append(self, turn):
+        """Add the newest turn, compressing the one that just went cold"""
+        turn = as_turn(turn)
+        self._turns.append(turn)
+        self._nbytes += turn.nbytes()
+        if len(self._turns) > self.hot_turns:
+            cold = self._turns[-self.hot_turns - 1]
+            before = cold.nbytes()
+            if cold.compress():
+                self._nbytes += cold.nbytes() - before
+
+    def extend_front(self, turns):
+        """Add older turns (oldest first) in front of the loaded ones"""
+        turns = [as_turn(turn) for turn in turns]
+        hot_from = len(turns) + len(self._turns) - self.hot_turns
+        for index, turn in enumerate(turns):
+            if index < hot_from:
+                turn.compress()
+            self._nbytes += turn.nbytes()
+        self._turns[:0] = turns
+
+    def spill(self, keep=0):
+        """Drop the oldest turns while over the cap, always keeping the newest `keep`"""
+        dropped = 0
+        while len(self._turns) > keep and self._nbytes > self.max_bytes:
+            self._nbytes -= self._turns.pop(0).nbytes()
+            dropped += 1
+        self.spilled += dropped
+        return dropped
+
+    def stats(self):
+        """Return turn counts and resident versus uncompressed size"""
+        turns = list(self._turns)
+        raw = sum(turn.raw_bytes() for turn in turns)
+        return {
+            "turns": len(turns),
+            "compressed": sum(turn.compressed for turn in turns),
+            "bytes": self._nbytes,
+            "raw_bytes": raw,
+            "ratio": self._nbytes / raw if raw else 1.0,
+            "spilled": self.spilled,
+        }
+
+
+def memory_report():
+    """Totals of stats() over every live history in the process"""
+    with _histories_lock:
+        histories = list(_histories)
+    report = {"sessions": len(histories), "turns": 0, "compressed": 0, "bytes": 0, "spilled": 0}
+    for history in histories:
+        report["turns"] += len(history)
+        report["compressed"] += sum(turn.compressed for turn in history)
+        report["bytes"] += history.nbytes
+        report["spilled"] += history.spilled
+    return report